@@ -6,9 +6,110 @@ load_dotenv()
 TMDB_API_KEY = os.getenv("TMDB_API_KEY")
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 MONGO_URI = os.getenv("MONGO_URI")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "5"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "3000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "3000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "5000"))
 JWT_SECRET = os.getenv("JWT_SECRET", "supersecret")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+# Coût bcrypt (les hashs existants sont mis à jour à la connexion si le coût change)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+# Cache des tokens JWT déjà vérifiés
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_MAX_TTL = float(os.getenv("TOKEN_CACHE_MAX_TTL", "3600"))
 CLIENT_ORIGIN = os.getenv("CLIENT_ORIGIN", "http://localhost:3000")
 RAWG_API_KEY = os.getenv("RAWG_API_KEY")
 
-print("MONGO_URI utilisé:", MONGO_URI)
+# URLs des fournisseurs amont (surchargeables pour pointer vers des bouchons locaux)
+TMDB_BASE_URL = os.getenv("TMDB_BASE_URL", "https://api.themoviedb.org/3")
+RAWG_BASE_URL = os.getenv("RAWG_BASE_URL", "https://api.rawg.io/api")
+OPENLIBRARY_BASE_URL = os.getenv("OPENLIBRARY_BASE_URL", "https://openlibrary.org")
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+
+# Récupération parallèle des métadonnées des médias likés
+METADATA_FETCH_CONCURRENCY = int(os.getenv("METADATA_FETCH_CONCURRENCY", "10"))
+METADATA_FETCH_DEADLINE = float(os.getenv("METADATA_FETCH_DEADLINE", "3.0"))
+
+# Résilience des appels amont (limiteur par fournisseur, disjoncteur, Retry-After)
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "1.0"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RECOVERY_TIME = float(os.getenv("CIRCUIT_RECOVERY_TIME", "30"))
+RETRY_AFTER_MAX_WAIT = float(os.getenv("RETRY_AFTER_MAX_WAIT", "2.0"))
+# Débits (requêtes/seconde) par fournisseur, par défaut ceux des quotas publiés
+TMDB_RATE_LIMIT = float(os.getenv("TMDB_RATE_LIMIT", "40"))
+RAWG_RATE_LIMIT = float(os.getenv("RAWG_RATE_LIMIT", "5"))
+OPENLIBRARY_RATE_LIMIT = float(os.getenv("OPENLIBRARY_RATE_LIMIT", "3"))
+OPENROUTER_RATE_LIMIT = float(os.getenv("OPENROUTER_RATE_LIMIT", str(20 / 60)))
+
+# Échéance (secondes) de chaque requête entrante, propagée aux appels amont
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "10.0"))
+# GET amont doublé quand il dépasse le p95 du fournisseur (après HEDGE_MIN_SAMPLES mesures)
+HEDGING_ENABLED = os.getenv("HEDGING_ENABLED", "true").lower() == "true"
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+
+# Budget de temps (secondes) de chaque section de /recommendations/multiple_media
+MULTIPLE_MEDIA_SECTION_BUDGET = float(os.getenv("MULTIPLE_MEDIA_SECTION_BUDGET", "8.0"))
+
+# Cache des métadonnées (get_media_info, get_game_info, get_book_info)
+METADATA_CACHE_SIZE = int(os.getenv("METADATA_CACHE_SIZE", "5000"))
+METADATA_CACHE_TTL = float(os.getenv("METADATA_CACHE_TTL", "3600"))
+METADATA_CACHE_MONGO_TTL = float(os.getenv("METADATA_CACHE_MONGO_TTL", str(7 * 24 * 3600)))
+
+# Listes de tendances servies depuis la mémoire
+TRENDING_REFRESH_INTERVAL = float(os.getenv("TRENDING_REFRESH_INTERVAL", "1800"))
+TRENDING_GAMES_PAGE_SIZE = int(os.getenv("TRENDING_GAMES_PAGE_SIZE", "40"))
+# Durée de cache HTTP (Cache-Control max-age) des listes publiques de tendances
+TOP_LIST_MAX_AGE = int(os.getenv("TOP_LIST_MAX_AGE", "300"))
+# Taille minimale (octets) d'une réponse dynamique pour être compressée
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1000"))
+
+# Cache de résolution titre -> média (suggestions du LLM)
+TITLE_CACHE_SIZE = int(os.getenv("TITLE_CACHE_SIZE", "20000"))
+TITLE_CACHE_TTL = float(os.getenv("TITLE_CACHE_TTL", str(24 * 3600)))
+TITLE_CACHE_MONGO_TTL = float(os.getenv("TITLE_CACHE_MONGO_TTL", str(30 * 24 * 3600)))
+TITLE_CACHE_NEGATIVE_TTL = float(os.getenv("TITLE_CACHE_NEGATIVE_TTL", str(24 * 3600)))
+
+# Catalogue local (index flou des titres) consulté avant les recherches amont
+CATALOG_ENABLED = os.getenv("CATALOG_ENABLED", "true").lower() == "true"
+CATALOG_INDEX_SIZE = int(os.getenv("CATALOG_INDEX_SIZE", "100000"))
+CATALOG_MATCH_THRESHOLD = float(os.getenv("CATALOG_MATCH_THRESHOLD", "0.8"))
+CATALOG_FLUSH_INTERVAL = float(os.getenv("CATALOG_FLUSH_INTERVAL", "30"))
+CATALOG_INGEST_INTERVAL = float(os.getenv("CATALOG_INGEST_INTERVAL", str(24 * 3600)))
+CATALOG_INGEST_PAGES = int(os.getenv("CATALOG_INGEST_PAGES", "5"))
+
+# Recommandations par ambiance pré-calculées
+MOOD_CACHE_VARIANTS = int(os.getenv("MOOD_CACHE_VARIANTS", "3"))
+MOOD_CACHE_REFRESH_INTERVAL = float(os.getenv("MOOD_CACHE_REFRESH_INTERVAL", str(12 * 3600)))
+# Jetons OpenRouter à laisser disponibles avant chaque appel de préchauffage (priorité aux utilisateurs)
+MOOD_CACHE_WARMUP_HEADROOM = float(os.getenv("MOOD_CACHE_WARMUP_HEADROOM", "3"))
+
+# Nombre de recommandations retournées par /recommendations
+RECOMMENDATION_LIMIT = int(os.getenv("RECOMMENDATION_LIMIT", "10"))
+# Titres supplémentaires demandés au LLM pour compenser ceux déjà likés/dislikés
+RECOMMENDATION_OVERFETCH = int(os.getenv("RECOMMENDATION_OVERFETCH", "5"))
+# Au-delà de ce nombre d'éléments exclus, l'index d'exclusion utilise un filtre de Bloom
+EXCLUSION_BLOOM_THRESHOLD = int(os.getenv("EXCLUSION_BLOOM_THRESHOLD", "5000"))
+EXCLUSION_BLOOM_ERROR_RATE = float(os.getenv("EXCLUSION_BLOOM_ERROR_RATE", "0.001"))
+
+# Workers de recalcul des recommandations matérialisées
+RECOMMENDATION_WORKERS = int(os.getenv("RECOMMENDATION_WORKERS", "2"))
+# Délai avant un nouveau recalcul quand l'amont était indisponible (résultat de repli non matérialisé)
+RECOMMENDATION_RETRY_DELAY = float(os.getenv("RECOMMENDATION_RETRY_DELAY", "60"))
+
+# Moteur de similarité local (premier étage de /recommendations, LLM en re-classement optionnel)
+SIMILARITY_ENABLED = os.getenv("SIMILARITY_ENABLED", "true").lower() == "true"
+SIMILARITY_DIM = int(os.getenv("SIMILARITY_DIM", "2048"))
+SIMILARITY_INDEX_SIZE = int(os.getenv("SIMILARITY_INDEX_SIZE", "50000"))
+SIMILARITY_MIN_SCORE = float(os.getenv("SIMILARITY_MIN_SCORE", "0.15"))
+SIMILARITY_LLM_RERANK = os.getenv("SIMILARITY_LLM_RERANK", "false").lower() == "true"
+
+# Filtrage collaboratif item-item (co-likes entre utilisateurs)
+COLLABORATIVE_ENABLED = os.getenv("COLLABORATIVE_ENABLED", "true").lower() == "true"
+COLLABORATIVE_MIN_SUPPORT = int(os.getenv("COLLABORATIVE_MIN_SUPPORT", "2"))
+
+# Journalisation structurée : niveau et taux d'échantillonnage des niveaux INFO et DEBUG
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_INFO_SAMPLE_RATE = float(os.getenv("LOG_INFO_SAMPLE_RATE", "1.0"))
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.01"))
@@ -0,0 +1,107 @@
+"""
+Migrations ponctuelles des données utilisateurs et d'interactions.
+
+Usage : python -m app.db.migrations
+"""
+import asyncio
+import logging
+from . import mongo
+from ..services.log import configure_logging, shutdown_logging
+
+logger = logging.getLogger(__name__)
+
+
+async def migrate_legacy_interaction_lists() -> int:
+    """
+    Convertit l'ancien format liste de `liked_ids`/`disliked_ids` (films uniquement)
+    en dictionnaire media_type -> liste d'ids.
+    """
+    migrated = 0
+    for field in ("liked_ids", "disliked_ids"):
+        result = await mongo.interactions_collection.update_many(
+            {field: {"$type": "array"}},
+            [{"$set": {field: {"movie": f"${field}"}}}],
+        )
+        migrated += result.modified_count
+    return migrated
+
+
+async def merge_duplicate_interactions() -> int:
+    """
+    Fusionne les documents d'interactions en double pour un même utilisateur
+    (préalable à l'index unique sur `user_id`).
+    """
+    merged = 0
+    duplicates = mongo.interactions_collection.aggregate([
+        {"$group": {"_id": "$user_id", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ])
+    async for group in duplicates:
+        keep_id, *other_ids = group["ids"]
+        async for other in mongo.interactions_collection.find({"_id": {"$in": other_ids}}):
+            await _absorb_interactions({"_id": keep_id}, other)
+        await mongo.interactions_collection.delete_many({"_id": {"$in": other_ids}})
+        merged += len(other_ids)
+    return merged
+
+
+async def _absorb_interactions(keep_filter: dict, other: dict, upsert: bool = False) -> None:
+    """
+    Ajoute les likes/dislikes du document `other` au document d'interactions désigné par `keep_filter`.
+    """
+    add_to_set = {}
+    for field in ("liked_ids", "disliked_ids"):
+        values = other.get(field) or {}
+        if isinstance(values, list):
+            values = {"movie": values}
+        for media_type, ids in values.items():
+            add_to_set[f"{field}.{media_type}"] = {"$each": ids}
+    if add_to_set:
+        await mongo.interactions_collection.update_one(keep_filter, {"$addToSet": add_to_set}, upsert=upsert)
+
+
+async def merge_duplicate_users() -> int:
+    """
+    Supprime les comptes en double pour un même email (préalable à l'index unique sur `email`).
+    Le compte le plus ancien est conservé : les interactions des autres y sont fusionnées,
+    les recommandations matérialisées des comptes concernés supprimées (recalculées à la demande).
+    """
+    merged = 0
+    duplicates = mongo.users_collection.aggregate([
+        {"$sort": {"_id": 1}},
+        {"$group": {"_id": "$email", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ])
+    async for group in duplicates:
+        keep_id, *other_ids = group["ids"]
+        other_user_ids = [str(other_id) for other_id in other_ids]
+        async for other in mongo.interactions_collection.find({"user_id": {"$in": other_user_ids}}):
+            await _absorb_interactions({"user_id": str(keep_id)}, other, upsert=True)
+        await mongo.interactions_collection.delete_many({"user_id": {"$in": other_user_ids}})
+        await mongo.user_recommendations_collection.delete_many(
+            {"user_id": {"$in": [str(keep_id), *other_user_ids]}}
+        )
+        await mongo.users_collection.delete_many({"_id": {"$in": other_ids}})
+        logger.warning(
+            "Comptes en double supprimés",
+            extra={"kept_id": str(keep_id), "removed_ids": other_user_ids},
+        )
+        merged += len(other_ids)
+    return merged
+
+
+async def main():
+    configure_logging()
+    await mongo.connect_mongo()
+    try:
+        logger.info("Champs liste convertis", extra={"count": await migrate_legacy_interaction_lists()})
+        logger.info("Comptes en double fusionnés", extra={"count": await merge_duplicate_users()})
+        logger.info("Documents d'interactions fusionnés", extra={"count": await merge_duplicate_interactions()})
+        await mongo.ensure_indexes()
+    finally:
+        mongo.close_mongo()
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
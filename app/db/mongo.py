@@ -1,7 +1,84 @@
-from pymongo import MongoClient
-from ..config import MONGO_URI
+import logging
+from typing import Optional
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import OperationFailure
+from ..services.metrics import MongoCommandListener
+from ..config import (
+    MONGO_URI, MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE,
+    MONGO_SERVER_SELECTION_TIMEOUT_MS, MONGO_CONNECT_TIMEOUT_MS, MONGO_SOCKET_TIMEOUT_MS,
+)
 
-client = MongoClient(MONGO_URI)
-db = client["recommendation_db"]
-users_collection = db["users"]
-interactions_collection = db["interactions"]
+logger = logging.getLogger(__name__)
+
+# Initialisés par connect_mongo() dans le lifespan de l'application
+client: Optional[AsyncIOMotorClient] = None
+db = None
+users_collection = None
+interactions_collection = None
+media_cache_collection = None
+title_resolutions_collection = None
+user_recommendations_collection = None
+catalog_collection = None
+revoked_tokens_collection = None
+
+async def connect_mongo():
+    """
+    Ouvre le client Mongo asynchrone (pool de connexions) et expose les collections.
+    """
+    global client, db, users_collection, interactions_collection
+    global media_cache_collection, title_resolutions_collection, user_recommendations_collection
+    global catalog_collection, revoked_tokens_collection
+    client = AsyncIOMotorClient(
+        MONGO_URI,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+        socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+        event_listeners=[MongoCommandListener()],
+    )
+    db = client["recommendation_db"]
+    users_collection = db["users"]
+    interactions_collection = db["interactions"]
+    media_cache_collection = db["media_cache"]
+    title_resolutions_collection = db["title_resolutions"]
+    user_recommendations_collection = db["user_recommendations"]
+    catalog_collection = db["catalog"]
+    revoked_tokens_collection = db["revoked_tokens"]
+
+def close_mongo():
+    if client is not None:
+        client.close()
+
+async def ensure_indexes():
+    """
+    Crée les index nécessaires et migre les interactions à l'ancien format (idempotent).
+    Appelé au démarrage de l'application.
+    """
+    # Un seul document d'interactions par utilisateur, un seul compte par email
+    for collection, field in ((interactions_collection, "user_id"), (users_collection, "email")):
+        try:
+            await collection.create_index(field, unique=True)
+        except OperationFailure as e:
+            # Sans ces index, l'unicité (inscription, interactions) n'est plus garantie : démarrage refusé
+            logger.error(
+                "Index unique impossible (doublons ?), lancer `python -m app.db.migrations`",
+                extra={"collection": collection.name, "field": field, "error": repr(e)},
+            )
+            raise RuntimeError(
+                f"Index unique sur {collection.name}.{field} impossible, lancer `python -m app.db.migrations`"
+            ) from e
+    # Ancien format liste de liked_ids/disliked_ids : incompatible avec les $addToSet par type
+    from .migrations import migrate_legacy_interaction_lists
+    migrated = await migrate_legacy_interaction_lists()
+    if migrated:
+        logger.info("Interactions au format liste migrées", extra={"documents": migrated})
+    # Recommandations matérialisées : une entrée par (utilisateur, type de média)
+    await user_recommendations_collection.create_index([("user_id", 1), ("media_type", 1)], unique=True)
+    # Purge automatique des métadonnées expirées
+    await media_cache_collection.create_index("expires_at", expireAfterSeconds=0)
+    await title_resolutions_collection.create_index("expires_at", expireAfterSeconds=0)
+    # Tokens révoqués purgés à leur expiration
+    await revoked_tokens_collection.create_index("exp", expireAfterSeconds=0)
+    # Chargement du catalogue local par type, les plus populaires d'abord
+    await catalog_collection.create_index([("media_type", 1), ("popularity", -1)])
@@ -1,9 +1,63 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from .routers import recommendation, auth, tmdb
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from .services.http_client import PROVIDERS, start_http_clients, close_http_clients
+from .services.trending import trending_store
+from .services.mood_cache import mood_cache
+from .services.recommender import materializer
+from .services.collaborative import collaborative_filter
+from .services.catalog import catalog
+from .services import catalog_ingest
+from .services.auth import start_password_pool, close_password_pool, token_cache_stats
+from .services.cache import metadata_cache, title_cache
+from .services.resilience import provider_available
+from .services.metrics import MetricsMiddleware, cache_collector, UPSTREAM_CIRCUIT_OPEN
+from .services.log import configure_logging, shutdown_logging
+from .services.deadline import DeadlineMiddleware
+from .services.serialization import FastJSONResponse, CompressionMiddleware
+from .db.mongo import connect_mongo, close_mongo, ensure_indexes
 from . import config
 
-app = FastAPI()
+
+cache_collector.register("metadata", metadata_cache.stats)
+cache_collector.register("titles", title_cache.stats)
+cache_collector.register("catalog", catalog.stats)
+cache_collector.register("tokens", token_cache_stats)
+for _provider in PROVIDERS:
+    UPSTREAM_CIRCUIT_OPEN.labels(_provider).set_function(lambda p=_provider: float(not provider_available(p)))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_logging()
+    await start_http_clients()
+    start_password_pool()
+    await connect_mongo()
+    await ensure_indexes()
+    background_tasks = [
+        asyncio.create_task(trending_store.run()),
+        asyncio.create_task(mood_cache.run()),
+        asyncio.create_task(collaborative_filter.run()),
+        *(asyncio.create_task(materializer.run()) for _ in range(config.RECOMMENDATION_WORKERS)),
+    ]
+    if config.CATALOG_ENABLED:
+        background_tasks += [
+            asyncio.create_task(catalog.run()),
+            asyncio.create_task(catalog_ingest.run()),
+        ]
+    yield
+    for task in background_tasks:
+        task.cancel()
+    await catalog.flush()
+    await close_http_clients()
+    close_password_pool()
+    close_mongo()
+    shutdown_logging()
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 origins = [
     config.CLIENT_ORIGIN,
@@ -16,12 +70,20 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware, minimum_size=config.COMPRESSION_MINIMUM_SIZE)
+app.add_middleware(DeadlineMiddleware, seconds=config.REQUEST_DEADLINE, exclude_suffixes=("/stream",))
+# Ajouté en dernier : le plus externe, il mesure la durée complète de chaque requête
+app.add_middleware(MetricsMiddleware)
 
 
 @app.get("/")
 async def root():
     return {"message": "Hello World"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 app.include_router(recommendation.router, prefix="/api", tags=["recommendation"])
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 app.include_router(tmdb.router, prefix="/api/tmdb", tags=["tmdb"])
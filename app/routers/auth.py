@@ -1,27 +1,50 @@
 from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from ..schemas.user import UserCreate, UserLogin, UserResponse, Token
-from ..db.mongo import users_collection
-from ..services.auth import hash_password, verify_password, create_access_token
+from ..db import mongo
+from ..services.auth import (
+    hash_password_async, verify_and_update_password_async, create_access_token,
+    get_user_id_from_token, revoke_token,
+)
 from bson import ObjectId
 from pymongo.errors import DuplicateKeyError
 
 router = APIRouter()
+security = HTTPBearer()
 
 @router.post("/register", response_model=UserResponse)
-def register(user: UserCreate):
-    if users_collection.find_one({"email": user.email}):
+async def register(user: UserCreate):
+    # Email déjà pris : refus avant le hashage bcrypt (pas de place prise dans le pool de processus)
+    if await mongo.users_collection.find_one({"email": user.email}, {"_id": 1}):
         raise HTTPException(status_code=400, detail="Email déjà utilisé")
-    hashed_pwd = hash_password(user.password)
+    hashed_pwd = await hash_password_async(user.password)
     user_dict = user.model_dump()
     user_dict["hashed_password"] = hashed_pwd
     del user_dict["password"]
-    result = users_collection.insert_one(user_dict)
+    # L'index unique sur `email` tranche les inscriptions concurrentes
+    try:
+        result = await mongo.users_collection.insert_one(user_dict)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email déjà utilisé")
     return UserResponse(id=str(result.inserted_id), email=user.email, username=user.username)
 
 @router.post("/login", response_model=Token)
-def login(user: UserLogin):
-    db_user = users_collection.find_one({"email": user.email})
-    if not db_user or not verify_password(user.password, db_user["hashed_password"]):
+async def login(user: UserLogin):
+    db_user = await mongo.users_collection.find_one({"email": user.email})
+    if not db_user:
+        raise HTTPException(status_code=401, detail="Identifiants invalides")
+    valid, new_hash = await verify_and_update_password_async(user.password, db_user["hashed_password"])
+    if not valid:
         raise HTTPException(status_code=401, detail="Identifiants invalides")
+    if new_hash:
+        # Coût bcrypt modifié : on re-hashe avec le nouveau coût
+        await mongo.users_collection.update_one({"_id": db_user["_id"]}, {"$set": {"hashed_password": new_hash}})
     access_token = create_access_token({"sub": str(db_user["_id"])})
-    return Token(access_token=str(access_token), token_type="bearer")
\ No newline at end of file
+    return Token(access_token=str(access_token), token_type="bearer")
+
+@router.post("/logout")
+async def logout(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    # Token valide requis : un token invalide ou déjà révoqué renvoie 401
+    await get_user_id_from_token(credentials.credentials)
+    await revoke_token(credentials.credentials)
+    return {"message": "Déconnexion effectuée"}
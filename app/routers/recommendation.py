@@ -1,443 +1,354 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+import logging
+import asyncio
+import json
+from contextlib import aclosing
+from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from ..schemas.interaction import LikeRequest, MoodRecommendationRequest
-from ..db.mongo import interactions_collection
+from ..db import mongo
 from ..services.tmdb_client import (
-    build_prompt_from_liked_media, search_media, build_prompt_from_mood, get_top_movies, get_top_media
+    build_prompt_from_liked_media, build_prompt_for_multiple_media
+)
+from ..services.openrouter_client import (
+    query_openrouter, parse_llm_titles, parse_llm_json_object, stream_llm_titles
 )
-from ..services.openrouter_client import query_openrouter
 from ..services.auth import get_user_id_from_token
-from ..services.rawg_client import get_suggested_games, get_top_games
-from ..services.openlibrary_client import get_book_info, search_book
-import json
+from ..services.deadline import budget, expired
+from ..services.serialization import FastJSONResponse, encoded_response
+from ..services.trending import trending_store
+from ..services.mood_cache import mood_cache
+from ..services.collaborative import collaborative_filter
+from ..services.openlibrary_client import search_books
+from ..services.recommender import (
+    get_liked_ids, get_disliked_ids, compute_recommendations, collect_book_authors_subjects,
+    build_exclusion_index, resolve_llm_titles, iter_resolved_titles,
+    get_materialized, store_materialized, materializer
+)
 from ..schemas.media import MediaRecommendation, MediaType
+from ..config import MULTIPLE_MEDIA_SECTION_BUDGET
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 security = HTTPBearer()
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+# Fallback ultime : livres populaires en dur
+FALLBACK_BOOKS = [
+    {"title": "1984", "author_name": ["George Orwell"], "key": "/works/OL7343626W"},
+    {"title": "Le Petit Prince", "author_name": ["Antoine de Saint-Exupéry"], "key": "/works/OL262758W"},
+    {"title": "Harry Potter à l'école des sorciers", "author_name": ["J.K. Rowling"], "key": "/works/OL82563W"},
+]
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     token = credentials.credentials
-    return get_user_id_from_token(token)
+    return await get_user_id_from_token(token)
 
 @router.get("/recommendations")
-def recommend(
+async def recommend(
     user_id: str = Depends(get_current_user),
     media_type: str = Query("movie", enum=["movie", "tv", "game", "book"])
 ):
-    record = interactions_collection.find_one({"user_id": user_id})
-    liked_ids = record.get("liked_ids", {}) if record else {}
-    if isinstance(liked_ids, list):
-        liked_ids = {"movie": liked_ids}
-    ids = liked_ids.get(media_type, [])
+    # Chemin courant : recommandations matérialisées (une lecture indexée)
+    materialized = await get_materialized(user_id, media_type)
+    if materialized is not None:
+        return _materialized_response(user_id, media_type, materialized["items"], materialized["updated_at"])
+    record = await mongo.interactions_collection.find_one({"user_id": user_id})
+    ids = get_liked_ids(record).get(media_type, [])
     if not ids:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Aucun {media_type} aimé trouvé pour cet utilisateur.")
-    # --- LOGIQUE SPECIALE POUR LES JEUX ---
-    if media_type == "game":
-        suggestions = []
-        seen_ids = set()
-        for game_id in ids:
-            try:
-                for game in get_suggested_games(game_id, page_size=10):
-                    if game["id"] not in seen_ids:
-                        suggestions.append(MediaRecommendation.from_game(game))
-                        seen_ids.add(game["id"])
-            except Exception as e:
-                print(f"[RAWG] Erreur suggestion pour {game_id}: {e}")
-        # Suggestions LLM (complément)
-        if len(suggestions) < 10:
-            prompt = build_prompt_from_liked_media(media_type, ids)
-            llm_response = query_openrouter(prompt)
-            try:
-                content_str = llm_response['choices'][0]['message']['content']
-                if content_str.strip().startswith("```json"):
-                    content_str = content_str.strip()[7:-3].strip()
-                elif content_str.strip().startswith("`"):
-                    content_str = content_str.strip().strip('`')
-                media_titles = json.loads(content_str)
-                if isinstance(media_titles, list):
-                    for title in media_titles:
-                        game = search_media(media_type, title)
-                        if game and game["id"] not in seen_ids:
-                            suggestions.append(MediaRecommendation.from_game(game))
-                            seen_ids.add(game["id"])
-                        if len(suggestions) >= 10:
-                            break
-            except Exception as e:
-                print(f"[LLM] Erreur parsing LLM pour jeux: {e}")
-        return suggestions[:10]
-    # --- LOGIQUE SPECIALE POUR LES LIVRES ---
-    if media_type == "book":
-        suggestions = []
-        seen_olids = set()
-        authors = set()
-        subjects = set()
-        # Récupérer auteurs et genres des livres likés
-        for olid in ids:
-            try:
-                book = get_book_info(olid)
-                if "authors" in book:
-                    for a in book["authors"]:
-                        if "name" in a:
-                            authors.add(a["name"])
-                if "subjects" in book:
-                    for s in book["subjects"]:
-                        subjects.add(s)
-            except Exception as e:
-                print(f"[OpenLibrary] Erreur info livre {olid}: {e}")
-        # Suggestions par auteur
-        for author in list(authors)[:2]:
-            try:
-                results = search_book(author)
-                for doc in results.get("docs", [])[:5]:
-                    olid = doc.get("key", "").replace("/works/", "")
-                    if olid and olid not in seen_olids:
-                        suggestions.append(MediaRecommendation.from_book(doc))
-                        seen_olids.add(olid)
-            except Exception as e:
-                print(f"[OpenLibrary] Erreur suggestion auteur {author}: {e}")
-        # Suggestions par genre
-        for subject in list(subjects)[:2]:
-            try:
-                results = search_book(subject)
-                for doc in results.get("docs", [])[:5]:
-                    olid = doc.get("key", "").replace("/works/", "")
-                    if olid and olid not in seen_olids:
-                        suggestions.append(MediaRecommendation.from_book(doc))
-                        seen_olids.add(olid)
-            except Exception as e:
-                print(f"[OpenLibrary] Erreur suggestion genre {subject}: {e}")
-        # Suggestions LLM (complément)
-        if len(suggestions) < 10:
-            prompt = build_prompt_from_liked_media(media_type, ids)
-            llm_response = query_openrouter(prompt)
-            try:
-                content_str = llm_response['choices'][0]['message']['content']
-                if content_str.strip().startswith("```json"):
-                    content_str = content_str.strip()[7:-3].strip()
-                elif content_str.strip().startswith("`"):
-                    content_str = content_str.strip().strip('`')
-                media_titles = json.loads(content_str)
-                if isinstance(media_titles, list):
-                    for title in media_titles:
-                        doc = search_book(title)
-                        if doc and "key" in doc and doc["key"].replace("/works/", "") not in seen_olids:
-                            suggestions.append(MediaRecommendation.from_book(doc))
-                            seen_olids.add(doc["key"].replace("/works/", ""))
-                        if len(suggestions) >= 10:
-                            break
-            except Exception as e:
-                print(f"[LLM] Erreur parsing LLM pour livres: {e}")
-        return suggestions[:10]
-    # --- LOGIQUE GENERIQUE POUR AUTRES MEDIAS ---
-    prompt = build_prompt_from_liked_media(media_type, ids)
-    llm_response = query_openrouter(prompt)
+    disliked_ids = get_disliked_ids(record).get(media_type, [])
     try:
-        content_str = llm_response['choices'][0]['message']['content']
-        if content_str.strip().startswith("```json"):
-            content_str = content_str.strip()[7:-3].strip()
-        elif content_str.strip().startswith("`"):
-            content_str = content_str.strip().strip('`')
-        media_titles = json.loads(content_str)
-        if not isinstance(media_titles, list):
-            raise ValueError("La réponse de l'IA n'est pas une liste.")
-        recommendations = []
-        for title in media_titles:
-            media_details = search_media(media_type, title)
-            if not media_details:
-                continue
-            if media_type == "book":
-                recommendations.append(MediaRecommendation.from_book(media_details))
-            else:
-                recommendations.append(MediaRecommendation.from_movie_tv(media_details, MediaType(media_type)))
-        return recommendations
+        recommendations, degraded = await compute_recommendations(media_type, ids, disliked_ids)
     except (KeyError, IndexError, ValueError) as e:
-        raw_content = llm_response.get('choices', [{}])[0].get('message', {}).get('content', 'Contenu non disponible')
-        print(f"Erreur de parsing de la réponse de l'IA: {e}")
-        print(f"Réponse brute: {raw_content}")
+        logger.warning("Réponse du LLM inexploitable", extra={"media_type": media_type, "error": repr(e)})
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Impossible de parser la recommandation de l'IA."
         )
+    items = [r.model_dump(mode="json") for r in recommendations]
+    if degraded:
+        # Repli sur les tendances (amont indisponible) : servi sans être matérialisé, recalcul plus tard
+        materializer.schedule_retry(user_id, media_type)
+        return _materialized_response(user_id, media_type, items, datetime.now(timezone.utc), degraded=True)
+    if expired():
+        # Échéance atteinte : résultat partiel servi tel quel, calcul complet laissé aux workers
+        materializer.schedule(user_id, media_type)
+        return _materialized_response(user_id, media_type, items, datetime.now(timezone.utc), partial=True)
+    updated_at = await store_materialized(user_id, media_type, recommendations)
+    return _materialized_response(user_id, media_type, items, updated_at)
+
+def _materialized_response(
+    user_id: str, media_type: str, items: list[dict], updated_at: datetime,
+    partial: bool = False, degraded: bool = False,
+) -> FastJSONResponse:
+    """
+    Réponse avec la date de calcul des recommandations (et si un recalcul est en attente,
+    si le résultat est partiel faute de temps ou dégradé faute d'amont).
+    """
+    if updated_at.tzinfo is None:
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    return FastJSONResponse(
+        content=items,
+        headers={
+            "X-Recommendations-Updated-At": updated_at.isoformat(),
+            "X-Recommendations-Stale": "true" if materializer.is_pending(user_id, media_type) else "false",
+            "X-Recommendations-Partial": "true" if partial else "false",
+            "X-Recommendations-Degraded": "true" if degraded else "false",
+        },
+    )
+
+def _format_stream_event(event: str, payload: dict, stream_format: str) -> str:
+    data = json.dumps(payload, ensure_ascii=False)
+    if stream_format == "sse":
+        return f"event: {event}\ndata: {data}\n\n"
+    return json.dumps({"type": event, "data": payload}, ensure_ascii=False) + "\n"
+
+async def _stream_recommendations(media_type: str, ids: list[str], disliked_ids: list[str], stream_format: str):
+    """
+    Émet chaque recommandation dès que son titre est résolu, puis un événement de synthèse.
+    """
+    suggested = count = 0
+
+    async def titles(prompt: str):
+        nonlocal suggested
+        async for title in stream_llm_titles(prompt):
+            suggested += 1
+            yield title
+
+    try:
+        # Le prompt charge les métadonnées des likés, lues ensuite dans le cache par l'index d'exclusion
+        prompt = await build_prompt_from_liked_media(media_type, ids)
+        exclusion = await build_exclusion_index(media_type, ids, disliked_ids)
+        async with aclosing(iter_resolved_titles(media_type, titles(prompt), exclusion, set())) as stream:
+            async for recommendation in stream:
+                count += 1
+                yield _format_stream_event("recommendation", recommendation.model_dump(mode="json"), stream_format)
+    except Exception as e:
+        logger.warning("Recommandations streamées interrompues", extra={"media_type": media_type, "error": repr(e)})
+        yield _format_stream_event("error", {"detail": "Impossible de parser la recommandation de l'IA."}, stream_format)
+        return
+    yield _format_stream_event(
+        "summary", {"media_type": media_type, "count": count, "suggested": suggested}, stream_format
+    )
+
+@router.get("/recommendations/stream")
+async def recommend_stream(
+    user_id: str = Depends(get_current_user),
+    media_type: str = Query("movie", enum=["movie", "tv", "game", "book"]),
+    format: str = Query("ndjson", enum=["ndjson", "sse"])
+):
+    """
+    Variante streamée de /recommendations (NDJSON ou server-sent events).
+    """
+    record = await mongo.interactions_collection.find_one({"user_id": user_id})
+    ids = get_liked_ids(record).get(media_type, [])
+    if not ids:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Aucun {media_type} aimé trouvé pour cet utilisateur.")
+    disliked_ids = get_disliked_ids(record).get(media_type, [])
+    media_type_header = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(
+        _stream_recommendations(media_type, ids, disliked_ids, format),
+        media_type=media_type_header,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @router.post("/recommendations/mood")
-def recommend_by_mood(
+async def recommend_by_mood(
+    request: Request,
     data: MoodRecommendationRequest,
     user_id: str = Depends(get_current_user),
     media_type: str = Query("movie", enum=["movie", "tv", "game", "book"])
 ):
-    prompt = build_prompt_from_mood(media_type, data.mood.value)
-    llm_response = query_openrouter(prompt)
     try:
-        content_str = llm_response['choices'][0]['message']['content']
-        if content_str.strip().startswith("```json"):
-            content_str = content_str.strip()[7:-3].strip()
-        elif content_str.strip().startswith("`"):
-            content_str = content_str.strip().strip('`')
-        media_titles = json.loads(content_str)
-        if not isinstance(media_titles, list):
-            raise ValueError("La réponse de l'IA n'est pas une liste.")
-        recommendations = []
-        for title in media_titles:
-            media_details = search_media(media_type, title)
-            if not media_details:
-                continue
-            if media_type == "game":
-                recommendations.append(MediaRecommendation.from_game(media_details))
-            elif media_type == "book":
-                recommendations.append(MediaRecommendation.from_book(media_details))
-            else:
-                recommendations.append(MediaRecommendation.from_movie_tv(media_details, MediaType(media_type)))
-        return recommendations
+        return encoded_response(request, await mood_cache.get(media_type, data.mood.value))
     except (KeyError, IndexError, ValueError) as e:
-        raw_content = llm_response.get('choices', [{}])[0].get('message', {}).get('content', 'Contenu non disponible')
-        print(f"Erreur de parsing de la réponse de l'IA: {e}")
-        print(f"Réponse brute: {raw_content}")
+        logger.warning("Réponse du LLM inexploitable", extra={"media_type": media_type, "error": repr(e)})
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Impossible de parser la recommandation de l'IA."
         )
 
-@router.get("/recommendations/multiple_media")
-def recommend_multiple_media(user_id: str = Depends(get_current_user)):
-    result = {}
-    types = ["movie", "tv", "game", "book"]
-    for media_type in types:
-        print(f"[multiple_media] Traitement de {media_type}")
-        record = interactions_collection.find_one({"user_id": user_id})
-        liked_ids = record.get("liked_ids", {}) if record else {}
-        if isinstance(liked_ids, list):
-            liked_ids = {"movie": liked_ids}
-        ids = liked_ids.get(media_type, [])
-        print(f"[multiple_media] {media_type} ids :", ids)
-        # Fallback si aucun like : top médias
-        if not ids:
-            if media_type == "movie":
-                top = get_top_movies("day")[:3]
-                result[media_type] = [MediaRecommendation.from_movie_tv(m, MediaType.MOVIE) for m in top]
-            elif media_type == "tv":
-                top = get_top_media("tv", "day")[:3]
-                result[media_type] = [MediaRecommendation.from_movie_tv(m, MediaType.TV) for m in top]
-            elif media_type == "game":
-                top = get_top_games(page_size=3)
-                result[media_type] = [MediaRecommendation.from_game(g) for g in top]
-            elif media_type == "book":
-                books = search_book("the").get("docs", [])
-                if not books:
-                    books = search_book("a").get("docs", [])
-                if not books:
-                    # Fallback ultime : livres populaires en dur
-                    books = [
-                        {"title": "1984", "author_name": ["George Orwell"], "key": "/works/OL7343626W"},
-                        {"title": "Le Petit Prince", "author_name": ["Antoine de Saint-Exupéry"], "key": "/works/OL262758W"},
-                        {"title": "Harry Potter à l'école des sorciers", "author_name": ["J.K. Rowling"], "key": "/works/OL82563W"},
-                    ]
-                print("[multiple_media] Livres fallback :", books[:3])
-                recos = [MediaRecommendation.from_book(b) for b in books[:3]]
-                print("[multiple_media] Livres recos :", recos)
-                result[media_type] = recos
-            continue
-        if media_type == "game":
-            # LOGIQUE LLM UNIQUEMENT POUR LES JEUX
-            prompt = build_prompt_from_liked_media(media_type, ids)
-            llm_response = query_openrouter(prompt)
-            try:
-                content_str = llm_response['choices'][0]['message']['content']
-                if content_str.strip().startswith("```json"):
-                    content_str = content_str.strip()[7:-3].strip()
-                elif content_str.strip().startswith("`"):
-                    content_str = content_str.strip().strip('`')
-                media_titles = json.loads(content_str)
-                if not isinstance(media_titles, list):
-                    result[media_type] = []
-                    continue
-                recommendations = []
-                seen_ids = set()
-                for title in media_titles:
-                    game = search_media(media_type, title)
-                    if game and game["id"] not in seen_ids:
-                        recommendations.append(MediaRecommendation.from_game(game))
-                        seen_ids.add(game["id"])
-                    if len(recommendations) >= 3:
-                        break
-                result[media_type] = recommendations
-            except Exception as e:
-                print(f"[LLM] Erreur parsing LLM pour jeux: {e}")
-                result[media_type] = []
-        elif media_type == "book":
-            suggestions = []
-            seen_olids = set()
-            authors = set()
-            subjects = set()
-            for olid in ids:
-                try:
-                    book = get_book_info(olid)
-                    if "authors" in book:
-                        for a in book["authors"]:
-                            if "name" in a:
-                                authors.add(a["name"])
-                    if "subjects" in book:
-                        for s in book["subjects"]:
-                            subjects.add(s)
-                except Exception as e:
-                    print(f"[OpenLibrary] Erreur info livre {olid}: {e}")
-            print(f"[multiple_media] book authors: {authors}, subjects: {subjects}")
-            for author in list(authors)[:1]:
-                try:
-                    results = search_book(author)
-                    for doc in results.get("docs", [])[:3]:
-                        olid = doc.get("key", "").replace("/works/", "")
-                        if olid and olid not in seen_olids:
-                            suggestions.append(MediaRecommendation.from_book(doc))
-                            seen_olids.add(olid)
-                        if len(suggestions) >= 3:
-                            break
-                except Exception as e:
-                    print(f"[OpenLibrary] Erreur suggestion auteur {author}: {e}")
-                if len(suggestions) >= 3:
-                    break
-            print(f"[multiple_media] book suggestions après auteurs: {suggestions}")
-            for subject in list(subjects)[:1]:
-                try:
-                    results = search_book(subject)
-                    for doc in results.get("docs", [])[:3]:
-                        olid = doc.get("key", "").replace("/works/", "")
-                        if olid and olid not in seen_olids:
-                            suggestions.append(MediaRecommendation.from_book(doc))
-                            seen_olids.add(olid)
-                        if len(suggestions) >= 3:
-                            break
-                except Exception as e:
-                    print(f"[OpenLibrary] Erreur suggestion genre {subject}: {e}")
-                if len(suggestions) >= 3:
-                    break
-            print(f"[multiple_media] book suggestions après genres: {suggestions}")
-            print(f"[multiple_media] book suggestions finales: {suggestions}")
-            if not suggestions:
-                # Fallback si aucune suggestion personnalisée
-                try:
-                    books = search_book("the").get("docs", [])
-                except Exception as e:
-                    print("[multiple_media] Erreur OpenLibrary (the) :", e)
-                    books = []
-                if not books:
-                    try:
-                        books = search_book("a").get("docs", [])
-                    except Exception as e:
-                        print("[multiple_media] Erreur OpenLibrary (a) :", e)
-                        books = []
-                if not books:
-                    books = [
-                        {"title": "1984", "author_name": ["George Orwell"], "key": "/works/OL7343626W"},
-                        {"title": "Le Petit Prince", "author_name": ["Antoine de Saint-Exupéry"], "key": "/works/OL262758W"},
-                        {"title": "Harry Potter à l'école des sorciers", "author_name": ["J.K. Rowling"], "key": "/works/OL82563W"},
-                    ]
-                print("[multiple_media] Fallback livres (likes présents) :", books[:3])
-                suggestions = [MediaRecommendation.from_book(b) for b in books[:3]]
-            result[media_type] = suggestions[:3]
-        else:
-            prompt = build_prompt_from_liked_media(media_type, ids)
-            llm_response = query_openrouter(prompt)
+async def _fallback_books() -> list[dict]:
+    for query in ("the", "a"):
+        try:
+            books = await search_books(query, limit=3)
+        except Exception as e:
+            logger.warning("Livres de repli Open Library indisponibles", extra={"query": query, "error": repr(e)})
+            books = []
+        if books:
+            return books
+    return FALLBACK_BOOKS
+
+async def _fallback_section(media_type: str) -> list[MediaRecommendation]:
+    """
+    Section de repli (tendances) quand l'utilisateur n'a rien liké ou que la section personnalisée échoue.
+    """
+    if media_type in ("movie", "tv"):
+        top = (await trending_store.get(media_type))[:3]
+        return [MediaRecommendation.from_movie_tv(m, MediaType(media_type)) for m in top]
+    if media_type == "game":
+        top = (await trending_store.get("game"))[:3]
+        return [MediaRecommendation.from_game(g) for g in top]
+    books = await _fallback_books()
+    return [MediaRecommendation.from_book(b) for b in books[:3]]
+
+async def _batched_llm_titles(liked_ids_by_type: dict[str, list[str]]) -> dict[str, list[str]]:
+    """
+    Un seul appel LLM pour tous les types likés (films, séries, jeux) ; réponse JSON indexée par type.
+    Retourne {} en cas d'échec : chaque section repasse alors par un appel dédié.
+    """
+    try:
+        prompt = await build_prompt_for_multiple_media(liked_ids_by_type, count=6)
+        return parse_llm_json_object(await query_openrouter(prompt))
+    except Exception as e:
+        logger.warning("Appel LLM groupé indisponible, appels par type", extra={"error": repr(e)})
+        return {}
+
+async def _llm_section_titles(media_type: str, ids: list[str], batched: asyncio.Task | None) -> list[str]:
+    """
+    Titres proposés par le LLM pour une section : réponse groupée si elle couvre ce type,
+    sinon appel dédié à ce type.
+    """
+    if batched is not None:
+        titles = (await asyncio.shield(batched)).get(media_type)
+        if titles:
+            return titles
+    prompt = await build_prompt_from_liked_media(media_type, ids)
+    return parse_llm_titles(await query_openrouter(prompt))
+
+async def _personalized_section(
+    media_type: str, ids: list[str], disliked_ids: list[str], batched: asyncio.Task | None = None
+) -> list[MediaRecommendation]:
+    """
+    Section personnalisée (3 éléments) à partir des médias likés.
+    """
+    exclusion = await build_exclusion_index(media_type, ids, disliked_ids)
+    if media_type == "book":
+        suggestions = []
+        seen_olids = set()
+        authors, subjects = await collect_book_authors_subjects(ids)
+        for query in list(authors)[:1] + list(subjects)[:1]:
             try:
-                content_str = llm_response['choices'][0]['message']['content']
-                if content_str.strip().startswith("```json"):
-                    content_str = content_str.strip()[7:-3].strip()
-                elif content_str.strip().startswith("`"):
-                    content_str = content_str.strip().strip('`')
-                media_titles = json.loads(content_str)
-                if not isinstance(media_titles, list):
-                    result[media_type] = []
-                    continue
-                recommendations = []
-                for title in media_titles:
-                    media_details = search_media(media_type, title)
-                    if not media_details:
-                        continue
-                    recommendations.append(MediaRecommendation.from_movie_tv(media_details, MediaType(media_type)))
-                    if len(recommendations) >= 3:
+                for doc in (await search_books(query, limit=3))[:3]:
+                    olid = doc.get("olid")
+                    if olid and olid not in seen_olids and not exclusion.excludes_id(olid):
+                        suggestions.append(MediaRecommendation.from_book(doc))
+                        seen_olids.add(olid)
+                    if len(suggestions) >= 3:
                         break
-                result[media_type] = recommendations
             except Exception as e:
-                print(f"[LLM] Erreur parsing LLM pour {media_type}: {e}")
-                result[media_type] = []
-    return result
+                logger.warning("Suggestions Open Library indisponibles", extra={"query": query, "error": repr(e)})
+            if len(suggestions) >= 3:
+                break
+        if not suggestions:
+            # Fallback si aucune suggestion personnalisée
+            return await _fallback_section(media_type)
+        return suggestions[:3]
+    # LOGIQUE LLM POUR FILMS, SERIES ET JEUX
+    try:
+        media_titles = await _llm_section_titles(media_type, ids, batched)
+    except Exception as e:
+        logger.warning("Suggestions LLM indisponibles", extra={"media_type": media_type, "error": repr(e)})
+        return []
+    return await resolve_llm_titles(media_type, media_titles, exclusion, set(), 3)
 
-@router.post("/like")
-def like_media(data: LikeRequest, user_id: str = Depends(get_current_user)):
-    record = interactions_collection.find_one({"user_id": user_id})
-    if not record:
-        interactions_collection.insert_one({
-            "user_id": user_id,
-            "liked_ids": {data.media_type: [data.media_id]},
-            "disliked_ids": {}
-        })
-    else:
-        liked = record.get("liked_ids", {})
-        # Correction : si liked est une liste (ancien format), on la convertit en dict
-        if isinstance(liked, list):
-            liked = {"movie": liked}
-        if data.media_type not in liked:
-            liked[data.media_type] = []
-        if data.media_id not in liked[data.media_type]:
-            liked[data.media_type].append(data.media_id)
-            interactions_collection.update_one(
-                {"user_id": user_id},
-                {"$set": {"liked_ids": liked}}
+async def _multiple_media_section(
+    media_type: str, ids: list[str], disliked_ids: list[str], batched: asyncio.Task | None = None
+) -> list[MediaRecommendation]:
+    """
+    Calcule une section dans son budget de temps (borné par l'échéance de la requête) ;
+    en cas de dépassement ou d'erreur, retourne la section de repli (ou une section vide
+    si le repli échoue aussi).
+    """
+    try:
+        if not ids:
+            return await asyncio.wait_for(_fallback_section(media_type), budget(MULTIPLE_MEDIA_SECTION_BUDGET))
+        return await asyncio.wait_for(
+            _personalized_section(media_type, ids, disliked_ids, batched), budget(MULTIPLE_MEDIA_SECTION_BUDGET)
+        )
+    except Exception as e:
+        logger.warning("Section multiple_media indisponible, repli", extra={"media_type": media_type, "error": repr(e)})
+    if not ids:
+        return []
+    try:
+        return await asyncio.wait_for(_fallback_section(media_type), budget(MULTIPLE_MEDIA_SECTION_BUDGET))
+    except Exception as e:
+        logger.warning("Repli multiple_media indisponible", extra={"media_type": media_type, "error": repr(e)})
+        return []
+
+@router.get("/recommendations/multiple_media")
+async def recommend_multiple_media(user_id: str = Depends(get_current_user)):
+    types = ["movie", "tv", "game", "book"]
+    record = await mongo.interactions_collection.find_one({"user_id": user_id})
+    liked_ids = get_liked_ids(record)
+    disliked_ids = get_disliked_ids(record)
+    # Films, séries et jeux likés : un seul appel LLM groupé plutôt qu'un appel par type
+    llm_liked = {t: liked_ids[t] for t in ("movie", "tv", "game") if liked_ids.get(t)}
+    batched = asyncio.create_task(_batched_llm_titles(llm_liked)) if len(llm_liked) > 1 else None
+    try:
+        sections = await asyncio.gather(*(
+            _multiple_media_section(
+                media_type, liked_ids.get(media_type, []), disliked_ids.get(media_type, []), batched
             )
+            for media_type in types
+        ))
+    finally:
+        if batched is not None:
+            batched.cancel()
+    return dict(zip(types, sections))
+
+@router.post("/like")
+async def like_media(data: LikeRequest, user_id: str = Depends(get_current_user)):
+    await mongo.interactions_collection.update_one(
+        {"user_id": user_id},
+        {
+            "$addToSet": {f"liked_ids.{data.media_type.value}": data.media_id},
+            "$setOnInsert": {"disliked_ids": {}},
+        },
+        upsert=True,
+    )
+    collaborative_filter.add_like(user_id, data.media_type.value, data.media_id)
+    materializer.schedule(user_id, data.media_type.value)
     return {"message": "Like enregistré"}
 
 @router.post("/dislike")
-def dislike_media(data: LikeRequest, user_id: str = Depends(get_current_user)):
-    record = interactions_collection.find_one({"user_id": user_id})
-    if not record:
-        interactions_collection.insert_one({
-            "user_id": user_id,
-            "liked_ids": {},
-            "disliked_ids": {data.media_type: [data.media_id]}
-        })
-    else:
-        disliked = record.get("disliked_ids", {})
-        if isinstance(disliked, list):
-            disliked = {"movie": disliked}
-        if data.media_type not in disliked:
-            disliked[data.media_type] = []
-        if data.media_id not in disliked[data.media_type]:
-            disliked[data.media_type].append(data.media_id)
-            interactions_collection.update_one(
-                {"user_id": user_id},
-                {"$set": {"disliked_ids": disliked}}
-            )
+async def dislike_media(data: LikeRequest, user_id: str = Depends(get_current_user)):
+    await mongo.interactions_collection.update_one(
+        {"user_id": user_id},
+        {
+            "$addToSet": {f"disliked_ids.{data.media_type.value}": data.media_id},
+            "$setOnInsert": {"liked_ids": {}},
+        },
+        upsert=True,
+    )
+    materializer.schedule(user_id, data.media_type.value)
     return {"message": "Dislike enregistré"}
 
 @router.post("/unlike")
-def unlike_media(data: LikeRequest, user_id: str = Depends(get_current_user)):
-    record = interactions_collection.find_one({"user_id": user_id})
-    if not record:
-        return {"message": "Aucun like trouvé pour cet utilisateur."}
-    liked = record.get("liked_ids", {})
-    if isinstance(liked, list):
-        liked = {"movie": liked}
-    if data.media_type in liked and data.media_id in liked[data.media_type]:
-        liked[data.media_type].remove(data.media_id)
-        interactions_collection.update_one(
-            {"user_id": user_id},
-            {"$set": {"liked_ids": liked}}
-        )
+async def unlike_media(data: LikeRequest, user_id: str = Depends(get_current_user)):
+    result = await mongo.interactions_collection.update_one(
+        {"user_id": user_id},
+        {"$pull": {f"liked_ids.{data.media_type.value}": data.media_id}},
+    )
+    if result.modified_count:
+        collaborative_filter.remove_like(user_id, data.media_type.value, data.media_id)
+        materializer.schedule(user_id, data.media_type.value)
         return {"message": "Like supprimé"}
+    if not result.matched_count:
+        return {"message": "Aucun like trouvé pour cet utilisateur."}
     return {"message": "Aucun like trouvé pour ce média."}
 
 @router.post("/undislike")
-def undislike_media(data: LikeRequest, user_id: str = Depends(get_current_user)):
-    record = interactions_collection.find_one({"user_id": user_id})
-    if not record:
-        return {"message": "Aucun dislike trouvé pour cet utilisateur."}
-    disliked = record.get("disliked_ids", {})
-    if isinstance(disliked, list):
-        disliked = {"movie": disliked}
-    if data.media_type in disliked and data.media_id in disliked[data.media_type]:
-        disliked[data.media_type].remove(data.media_id)
-        interactions_collection.update_one(
-            {"user_id": user_id},
-            {"$set": {"disliked_ids": disliked}}
-        )
+async def undislike_media(data: LikeRequest, user_id: str = Depends(get_current_user)):
+    result = await mongo.interactions_collection.update_one(
+        {"user_id": user_id},
+        {"$pull": {f"disliked_ids.{data.media_type.value}": data.media_id}},
+    )
+    if result.modified_count:
+        materializer.schedule(user_id, data.media_type.value)
         return {"message": "Dislike supprimé"}
-    return {"message": "Aucun dislike trouvé pour ce média."}
\ No newline at end of file
+    if not result.matched_count:
+        return {"message": "Aucun dislike trouvé pour cet utilisateur."}
+    return {"message": "Aucun dislike trouvé pour ce média."}
@@ -1,31 +1,52 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from ..services.tmdb_client import get_top_movies, get_movie_info, get_recommendations_from_movie
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from ..services.tmdb_client import get_movie_info, get_recommendations_from_movie
 from ..services.rawg_client import get_top_games
+from ..services.trending import trending_store
+from ..services.serialization import PayloadCache, encoded_response
+from ..config import TRENDING_GAMES_PAGE_SIZE, TOP_LIST_MAX_AGE, TRENDING_REFRESH_INTERVAL
 from ..schemas.media import MediaRecommendation, MediaType
 
 router = APIRouter()
 
+# Listes publiques identiques pour tous : sérialisées et compressées une fois par rafraîchissement
+_top_payloads = PayloadCache()
+_TOP_CACHE_CONTROL = f"public, max-age={TOP_LIST_MAX_AGE}, stale-while-revalidate={int(TRENDING_REFRESH_INTERVAL)}"
+
 @router.get("/movie/top")
-def get_top_movies_tmdb():
-    movies = get_top_movies("day")
-    return [MediaRecommendation.from_movie_tv(movie, MediaType.MOVIE) for movie in movies]
+async def get_top_movies_tmdb(request: Request):
+    movies = await trending_store.get("movie")
+    payload = _top_payloads.get(
+        "movie",
+        trending_store.updated_at("movie"),
+        lambda: [MediaRecommendation.from_movie_tv(movie, MediaType.MOVIE) for movie in movies],
+    )
+    return encoded_response(request, payload, _TOP_CACHE_CONTROL)
 
 @router.get("/movie/{tmdb_id}")
-def get_movie_tmdb(tmdb_id: str):
-    movie = get_movie_info(tmdb_id)
+async def get_movie_tmdb(tmdb_id: str):
+    movie = await get_movie_info(tmdb_id)
     return MediaRecommendation.from_movie_tv(movie, MediaType.MOVIE)
 
 @router.get("/movie/{tmdb_id}/recommendations")
-def get_recommendations_from_movie_tmdb(tmdb_id: str):
-    movies = get_recommendations_from_movie(tmdb_id)
+async def get_recommendations_from_movie_tmdb(tmdb_id: str):
+    movies = await get_recommendations_from_movie(tmdb_id)
     return [MediaRecommendation.from_movie_tv(movie, MediaType.MOVIE) for movie in movies]
 
 @router.get("/game/top")
-def get_top_games_rawg(
+async def get_top_games_rawg(
+    request: Request,
     year: int = Query(None, description="Année (par défaut année en cours)"),
     ordering: str = Query("-added", description="Tri RAWG : -added, -rating, -released, etc."),
     page_size: int = Query(10, description="Nombre de jeux à retourner")
 ):
     """Top jeux vidéo de l'année (ou d'une année donnée) via RAWG.io"""
-    games = get_top_games(year=year, ordering=ordering, page_size=page_size)
-    return [MediaRecommendation.from_game(game) for game in games]
\ No newline at end of file
+    if year is None and ordering == "-added" and page_size <= TRENDING_GAMES_PAGE_SIZE:
+        games = (await trending_store.get("game"))[:page_size]
+        payload = _top_payloads.get(
+            ("game", page_size),
+            trending_store.updated_at("game"),
+            lambda: [MediaRecommendation.from_game(game) for game in games],
+        )
+        return encoded_response(request, payload, _TOP_CACHE_CONTROL)
+    games = await get_top_games(year=year, ordering=ordering, page_size=page_size)
+    return [MediaRecommendation.from_game(game) for game in games]
@@ -1,6 +1,7 @@
 from pydantic import BaseModel
 from typing import List, Optional
 from enum import Enum
+from .media import MediaType
 
 class Mood(str, Enum):
     CHILL = "chill"
@@ -15,7 +16,7 @@ class RecommendationRequest(BaseModel):
 
 class LikeRequest(BaseModel):
     media_id: str
-    media_type: str  # 'movie', 'tv', etc. enum ?
+    media_type: MediaType
 
 class MoodRecommendationRequest(BaseModel):
     mood: Mood
\ No newline at end of file
@@ -122,4 +122,13 @@ class MediaRecommendation(BaseModel):
             media_type=MediaType.BOOK,
             genres=data.get("subjects", []),
             author=data.get("author_name", [None])[0] if isinstance(data.get("author_name"), list) else data.get("author_name")
-        ) 
\ No newline at end of file
+        )
+
+    @classmethod
+    def from_media(cls, data: dict, media_type: MediaType):
+        """Construit la recommandation selon le type de média (TMDB, RAWG ou Open Library)"""
+        if media_type == MediaType.GAME:
+            return cls.from_game(data)
+        if media_type == MediaType.BOOK:
+            return cls.from_book(data)
+        return cls.from_movie_tv(data, media_type)
@@ -1,10 +1,55 @@
+import asyncio
+import hashlib
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
 from passlib.context import CryptContext
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from jose import jwt, JWTError
 from fastapi import HTTPException, status
-from ..config import JWT_SECRET, JWT_ALGORITHM
+from ..config import (
+    JWT_SECRET, JWT_ALGORITHM, BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS,
+    TOKEN_CACHE_SIZE, TOKEN_CACHE_MAX_TTL,
+)
+from .cache import TTLCache
+from ..db import mongo
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# min/max = coût cible : un hash d'un autre coût est signalé à re-hasher (verify_and_update)
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+# Tokens déjà vérifiés (clé : empreinte SHA-256 du token)
+_verified_tokens = TTLCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_MAX_TTL)
+# Révocations faites par ce processus (empreinte -> exp) ; la référence partagée entre workers
+# est la collection Mongo `revoked_tokens`, consultée avant le cache des tokens valides
+_revoked_tokens: dict[str, float] = {}
+
+# Pool de processus dédié à bcrypt (CPU), démarré dans le lifespan
+_password_pool: Optional[ProcessPoolExecutor] = None
+
+def start_password_pool():
+    """
+    Les workers sont créés à la demande, quand le processus a déjà des threads (logging, motor) :
+    forkserver (spawn à défaut) plutôt que fork, qui peut bloquer un enfant sur un verrou hérité.
+    """
+    global _password_pool
+    if _password_pool is None:
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _password_pool = ProcessPoolExecutor(
+            max_workers=PASSWORD_HASH_WORKERS, mp_context=multiprocessing.get_context(method)
+        )
+
+def close_password_pool():
+    global _password_pool
+    if _password_pool is not None:
+        _password_pool.shutdown(cancel_futures=True)
+        _password_pool = None
 
 # Hashage du mot de passe
 def hash_password(password: str) -> str:
@@ -13,6 +58,20 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    """
+    Vérifie le mot de passe et retourne un nouveau hash si le coût bcrypt a changé.
+    """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+async def hash_password_async(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_pool, hash_password, password)
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_pool, verify_and_update_password, plain_password, hashed_password)
+
 # Génération du token JWT
 def create_access_token(data: dict, expires_delta: timedelta = timedelta(hours=1)):
     to_encode = data.copy()
@@ -21,12 +80,61 @@ def create_access_token(data: dict, expires_delta: timedelta = timedelta(hours=1
     encoded_jwt = jwt.encode(to_encode, JWT_SECRET, algorithm=JWT_ALGORITHM)
     return encoded_jwt
 
-def get_user_id_from_token(token: str) -> str:
+def _token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+def token_cache_stats() -> dict:
+    return {
+        "memory_hits": _verified_tokens.hits,
+        "misses": _verified_tokens.misses,
+        "memory_size": len(_verified_tokens),
+    }
+
+async def revoke_token(token: str) -> None:
+    """
+    Révoque un token jusqu'à son expiration, pour tous les workers (collection `revoked_tokens`,
+    purgée par un index TTL sur `exp`).
+    """
+    now = time.time()
+    for digest, exp in list(_revoked_tokens.items()):
+        if exp <= now:
+            del _revoked_tokens[digest]
+    digest = _token_digest(token)
+    try:
+        expires_at = jwt.get_unverified_claims(token).get("exp") or now + TOKEN_CACHE_MAX_TTL
+    except JWTError:
+        expires_at = now + TOKEN_CACHE_MAX_TTL
+    _revoked_tokens[digest] = expires_at
+    _verified_tokens.pop(digest)
+    await mongo.revoked_tokens_collection.update_one(
+        {"_id": digest},
+        {"$set": {"exp": datetime.fromtimestamp(expires_at, timezone.utc)}},
+        upsert=True,
+    )
+
+async def _is_revoked(digest: str) -> bool:
+    if digest in _revoked_tokens:
+        return True
+    return await mongo.revoked_tokens_collection.find_one({"_id": digest}, {"_id": 1}) is not None
+
+async def get_user_id_from_token(token: str) -> str:
+    digest = _token_digest(token)
+    # Révocation vérifiée avant le cache : un token révoqué par un autre worker est refusé
+    if await _is_revoked(digest):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token invalide")
+    user_id = _verified_tokens.get(digest)
+    if user_id is not None:
+        return user_id
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
         user_id: str = payload.get("sub")
         if user_id is None:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token invalide")
-        return user_id
     except JWTError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token invalide") 
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token invalide")
+    # Le token reste en cache jusqu'à son `exp` (borné par TOKEN_CACHE_MAX_TTL)
+    exp = payload.get("exp")
+    ttl = TOKEN_CACHE_MAX_TTL if exp is None else min(TOKEN_CACHE_MAX_TTL, exp - time.time())
+    if ttl > 0:
+        _verified_tokens.set(digest, user_id, ttl)
+    return user_id
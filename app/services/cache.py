@@ -0,0 +1,244 @@
+import logging
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Hashable, Optional
+import httpx
+from .singleflight import SingleFlight
+from .resilience import DeadlineExceeded
+from ..db import mongo
+from ..config import (
+    METADATA_CACHE_SIZE, METADATA_CACHE_TTL, METADATA_CACHE_MONGO_TTL,
+    TITLE_CACHE_SIZE, TITLE_CACHE_TTL, TITLE_CACHE_MONGO_TTL, TITLE_CACHE_NEGATIVE_TTL,
+)
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+# Année entre parenthèses/crochets ou après un tiret en fin de titre : "Dune (2021)", "Dune - 2021"
+_YEAR_SUFFIX_RE = re.compile(r"\s*(?:[\(\[]\s*(?:19|20)\d{2}\s*[\)\]]|\s-\s*(?:19|20)\d{2})\s*$")
+_PUNCTUATION_RE = re.compile(r"[^\w\s]|_")
+
+
+class TTLCache:
+    """
+    Cache LRU borné en mémoire avec expiration (TTL) par entrée.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        # Une entrée expirée reste en place (évincée par le LRU) pour servir de repli via get_stale()
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def get_stale(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Dernière valeur connue, même expirée (repli quand l'amont est indisponible).
+        """
+        entry = self._data.get(key)
+        return default if entry is None else entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class TwoTierCache:
+    """
+    Cache à deux niveaux :
+    - Niveau 1 : LRU en mémoire (par processus)
+    - Niveau 2 : collection Mongo partagée, purgée par un index TTL sur `expires_at`
+    Si `negative_ttl` est fourni, les résultats `None` sont aussi mis en cache (cache négatif).
+    """
+
+    def __init__(self, name: str, collection_name: str, maxsize: int, ttl: float, mongo_ttl: float, negative_ttl: Optional[float] = None):
+        self.name = name
+        self.collection_name = collection_name
+        self.memory = TTLCache(maxsize, ttl)
+        self.mongo_ttl = mongo_ttl
+        self.negative_ttl = negative_ttl
+        self.mongo_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._flight = SingleFlight()
+
+    @staticmethod
+    def _mongo_key(key: tuple) -> str:
+        return ":".join(str(part) for part in key)
+
+    async def get_or_fetch(self, key: tuple, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        data = self.memory.get(key, _MISSING)
+        if data is not _MISSING:
+            return data
+        # Les requêtes concurrentes sur une même clé absente partagent un seul chargement
+        try:
+            return await self._flight.do(key, lambda: self._load(key, fetch))
+        except DeadlineExceeded:
+            # Échéance de cet appelant atteinte avant la fin du chargement partagé
+            stale = self.memory.get_stale(key, _MISSING)
+            if stale is _MISSING:
+                raise
+            self.stale_hits += 1
+            return stale
+
+    async def _load(self, key: tuple, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            doc = await mongo.db[self.collection_name].find_one({"_id": self._mongo_key(key)})
+        except Exception as e:
+            logger.warning("Lecture Mongo du cache impossible", extra={"cache": self.name, "key": self._mongo_key(key), "error": repr(e)})
+            doc = None
+        if doc is not None:
+            self.mongo_hits += 1
+            self.memory.set(key, doc["data"], None if doc["data"] is not None else self.negative_ttl)
+            return doc["data"]
+        self.misses += 1
+        try:
+            data = await fetch()
+        except httpx.HTTPError:
+            # Fournisseur en panne ou disjoncteur ouvert : dernière valeur connue si disponible
+            stale = self.memory.get_stale(key, _MISSING)
+            if stale is _MISSING:
+                raise
+            self.stale_hits += 1
+            return stale
+        if data is None and self.negative_ttl is None:
+            return data
+        ttl = self.negative_ttl if data is None else None
+        self.memory.set(key, data, ttl)
+        mongo_ttl = self.mongo_ttl if data is not None else self.negative_ttl
+        try:
+            await mongo.db[self.collection_name].replace_one(
+                {"_id": self._mongo_key(key)},
+                {
+                    "data": data,
+                    "expires_at": datetime.now(timezone.utc) + timedelta(seconds=mongo_ttl),
+                },
+                upsert=True,
+            )
+        except Exception as e:
+            logger.warning("Écriture Mongo du cache impossible", extra={"cache": self.name, "key": self._mongo_key(key), "error": repr(e)})
+        return data
+
+    def stats(self) -> dict:
+        return {
+            "memory_hits": self.memory.hits,
+            "mongo_hits": self.mongo_hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "memory_size": len(self.memory),
+        }
+
+
+class MetadataCache(TwoTierCache):
+    """
+    Cache des métadonnées de médias (TMDB, RAWG, OpenLibrary).
+    Clé : (media_type, id, langue)
+    """
+
+    async def get_or_fetch_media(
+        self,
+        media_type: str,
+        media_id: str,
+        language: Optional[str],
+        fetch: Callable[[], Awaitable[dict]],
+    ) -> dict:
+        return await self.get_or_fetch((media_type, str(media_id), language or ""), fetch)
+
+    async def peek_media(self, media_type: str, media_ids: list[str], language: Optional[str]) -> dict[str, dict]:
+        """
+        Métadonnées déjà connues (mémoire, puis Mongo en une requête), sans aucun appel amont.
+        """
+        found = {}
+        missing = {}
+        for media_id in media_ids:
+            key = (media_type, str(media_id), language or "")
+            data = self.memory.get_stale(key)
+            if data is not None:
+                found[str(media_id)] = data
+            else:
+                missing[self._mongo_key(key)] = key
+        if not missing:
+            return found
+        try:
+            async for doc in mongo.db[self.collection_name].find({"_id": {"$in": list(missing)}}):
+                if doc.get("data") is not None:
+                    key = missing[doc["_id"]]
+                    self.memory.set(key, doc["data"])
+                    found[key[1]] = doc["data"]
+        except Exception as e:
+            logger.warning("Lecture Mongo du cache impossible", extra={"cache": self.name, "keys": len(missing), "error": repr(e)})
+        return found
+
+
+def split_title_year(title: str) -> tuple[str, Optional[int]]:
+    """
+    Sépare l'année finale éventuelle d'un titre : "Dune (2021)" -> ("Dune", 2021).
+    """
+    match = _YEAR_SUFFIX_RE.search(title)
+    if match is None:
+        return title, None
+    return title[:match.start()], int(re.search(r"\d{4}", match.group()).group())
+
+
+def normalize_title(title: str) -> str:
+    """
+    Normalise un titre pour la résolution : casse, accents, ponctuation et année finale
+    ("Amélie (2001)" -> "amelie", "Spider-Man: No Way Home" -> "spider man no way home").
+    """
+    title = unicodedata.normalize("NFKD", title)
+    title = "".join(c for c in title if not unicodedata.combining(c)).lower()
+    title = _YEAR_SUFFIX_RE.sub("", title)
+    title = _PUNCTUATION_RE.sub(" ", title)
+    return " ".join(title.split())
+
+
+class TitleResolutionCache(TwoTierCache):
+    """
+    Cache de résolution titre -> média (résultat de search_media), avec cache négatif
+    pour les titres introuvables.
+    Clé : (media_type, titre normalisé), suivie de l'année quand le titre en précise une
+    ("Dune (1984)" et "Dune (2021)" sont deux résolutions distinctes)
+    """
+
+    async def resolve(self, media_type: str, title: str, search: Callable[[], Awaitable[Optional[dict]]]) -> Optional[dict]:
+        normalized = normalize_title(title)
+        if not normalized:
+            return None
+        _, year = split_title_year(title)
+        key = (media_type, normalized) if year is None else (media_type, normalized, year)
+        return await self.get_or_fetch(key, search)
+
+
+metadata_cache = MetadataCache(
+    "metadata", "media_cache",
+    METADATA_CACHE_SIZE, METADATA_CACHE_TTL, METADATA_CACHE_MONGO_TTL,
+)
+title_cache = TitleResolutionCache(
+    "titles", "title_resolutions",
+    TITLE_CACHE_SIZE, TITLE_CACHE_TTL, TITLE_CACHE_MONGO_TTL, negative_ttl=TITLE_CACHE_NEGATIVE_TTL,
+)
@@ -0,0 +1,293 @@
+import logging
+import asyncio
+from collections import Counter, OrderedDict, defaultdict
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+from pymongo import UpdateOne
+from .cache import normalize_title, split_title_year
+from ..schemas.media import MediaType
+from ..db import mongo
+from ..config import (
+    CATALOG_INDEX_SIZE, CATALOG_MATCH_THRESHOLD, CATALOG_FLUSH_INTERVAL,
+)
+
+logger = logging.getLogger(__name__)
+
+# Bonus / malus de score selon l'année demandée ("Dune (2021)") et celle du média
+_YEAR_MATCH_BONUS = 0.1
+_YEAR_MISMATCH_PENALTY = 0.3
+# Candidats dont le score exact est recalculé après le comptage des trigrammes
+_RESCORED_CANDIDATES = 20
+
+
+def trigrams(normalized: str) -> set[str]:
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _dice(a: set[str], b: set[str]) -> float:
+    return 2 * len(a & b) / (len(a) + len(b)) if a and b else 0.0
+
+
+def _year(value) -> Optional[int]:
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value[:4].isdigit():
+        return int(value[:4])
+    return None
+
+
+def describe(media_type: str, raw: dict) -> Optional[tuple[str, list[str], Optional[int], float]]:
+    """
+    (id, titres, année, popularité) d'un média brut (TMDB, RAWG ou Open Library), ou None.
+    """
+    if media_type == "movie":
+        media_id, titles = raw.get("id"), [raw.get("title"), raw.get("original_title")]
+        year, popularity = _year(raw.get("release_date")), raw.get("popularity")
+    elif media_type == "tv":
+        media_id, titles = raw.get("id"), [raw.get("name"), raw.get("original_name")]
+        year, popularity = _year(raw.get("first_air_date")), raw.get("popularity")
+    elif media_type == "game":
+        media_id, titles = raw.get("id"), [raw.get("name")]
+        year, popularity = _year(raw.get("released")), raw.get("added")
+    else:
+        media_id = raw.get("olid") or (raw.get("key") or "").replace("/works/", "")
+        titles = [raw.get("title")]
+        year, popularity = _year(raw.get("first_publish_year")), raw.get("edition_count")
+    titles = list(dict.fromkeys(t for t in titles if isinstance(t, str) and t.strip()))
+    if not media_id or not titles:
+        return None
+    return str(media_id), titles, year, float(popularity or 0)
+
+
+class TitleIndex:
+    """
+    Index flou des titres d'un type de média, en mémoire :
+    - correspondance exacte sur le titre normalisé
+    - sinon similarité de Dice sur les trigrammes (listes inversées trigramme -> titres)
+    - départage par l'année demandée puis par la popularité
+    Les médias les plus anciens sont évincés au-delà de `max_items`.
+    """
+
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._media: OrderedDict[str, tuple[list[int], Optional[int], float]] = OrderedDict()
+        self._titles: dict[int, tuple[str, str]] = {}
+        self._exact: dict[str, set[int]] = defaultdict(set)
+        self._postings: dict[str, set[int]] = defaultdict(set)
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self._media)
+
+    def __contains__(self, media_id: str) -> bool:
+        return media_id in self._media
+
+    def add(self, media_id: str, titles: list[str], year: Optional[int], popularity: float) -> None:
+        self.remove(media_id)
+        title_ids = []
+        for title in titles:
+            normalized = normalize_title(title)
+            if not normalized:
+                continue
+            title_id = self._next_id
+            self._next_id += 1
+            self._titles[title_id] = (media_id, normalized)
+            self._exact[normalized].add(title_id)
+            for gram in trigrams(normalized):
+                self._postings[gram].add(title_id)
+            title_ids.append(title_id)
+        if not title_ids:
+            return
+        self._media[media_id] = (title_ids, year, popularity)
+        while len(self._media) > self.max_items:
+            self.remove(next(iter(self._media)))
+
+    def remove(self, media_id: str) -> None:
+        entry = self._media.pop(media_id, None)
+        if entry is None:
+            return
+        for title_id in entry[0]:
+            _, normalized = self._titles.pop(title_id)
+            self._exact[normalized].discard(title_id)
+            if not self._exact[normalized]:
+                del self._exact[normalized]
+            for gram in trigrams(normalized):
+                postings = self._postings[gram]
+                postings.discard(title_id)
+                if not postings:
+                    del self._postings[gram]
+
+    def _candidates(self, normalized: str) -> dict[int, float]:
+        exact = self._exact.get(normalized)
+        if exact:
+            return {title_id: 1.0 for title_id in exact}
+        grams = trigrams(normalized)
+        # Les trigrammes très fréquents (" th", "the"...) sont ignorés au comptage s'il en reste d'autres
+        frequent = max(1000, len(self._titles) // 20)
+        selective = [g for g in grams if len(self._postings.get(g, ())) <= frequent] or list(grams)
+        counts = Counter()
+        for gram in selective:
+            counts.update(self._postings.get(gram, ()))
+        return {
+            title_id: _dice(grams, trigrams(self._titles[title_id][1]))
+            for title_id, _ in counts.most_common(_RESCORED_CANDIDATES)
+        }
+
+    def search(self, title: str, year: Optional[int] = None) -> Optional[tuple[str, float]]:
+        """
+        Meilleur média pour `title` (et `year` si connue) : (id, score), ou None sous le seuil.
+        """
+        normalized = normalize_title(title)
+        if not normalized:
+            return None
+        best = None
+        for title_id, score in self._candidates(normalized).items():
+            media_id = self._titles[title_id][0]
+            _, media_year, popularity = self._media[media_id]
+            if year is not None and media_year is not None:
+                score += _YEAR_MATCH_BONUS if media_year == year else -_YEAR_MISMATCH_PENALTY
+            if score < CATALOG_MATCH_THRESHOLD:
+                continue
+            if best is None or (score, popularity) > best[1:]:
+                best = (media_id, score, popularity)
+        return None if best is None else (best[0], best[1])
+
+
+def rank_results(media_type: str, title: str, results: list[dict]) -> Optional[dict]:
+    """
+    Choisit parmi des résultats de recherche amont celui dont le titre (et l'année) correspond
+    le mieux à `title`, plutôt que le premier ; l'ordre amont départage les égalités.
+    """
+    base, year = split_title_year(title)
+    query = trigrams(normalize_title(base))
+    best, best_score = None, float("-inf")
+    for raw in results:
+        described = describe(media_type, raw)
+        if described is None:
+            continue
+        _, titles, media_year, _ = described
+        score = max(_dice(query, trigrams(normalize_title(t))) for t in titles)
+        if year is not None and media_year is not None:
+            score += _YEAR_MATCH_BONUS if media_year == year else -_YEAR_MISMATCH_PENALTY
+        if score > best_score:
+            best, best_score = raw, score
+    return best if best is not None else (results[0] if results else None)
+
+
+class Catalog:
+    """
+    Catalogue local des médias déjà rencontrés (tendances, métadonnées, recherches, suggestions,
+    ingestion des pages populaires), persisté dans la collection `catalog` et indexé en mémoire
+    (un TitleIndex par type : un titre de film ne résout jamais une série).
+    search_media le consulte avant toute recherche amont.
+    """
+
+    def __init__(self, max_items: int):
+        self.indexes = {media_type.value: TitleIndex(max_items) for media_type in MediaType}
+        self._pending: dict[str, dict] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        return {
+            "memory_hits": self.hits,
+            "misses": self.misses,
+            "memory_size": sum(len(index) for index in self.indexes.values()),
+        }
+
+    def observe(self, media_type: str, raw_items: Iterable[dict]) -> None:
+        """
+        Ajoute des médias bruts à l'index ; l'écriture Mongo est groupée (flush périodique).
+        """
+        index = self.indexes.get(media_type)
+        if index is None:
+            return
+        for raw in raw_items:
+            if not isinstance(raw, dict):
+                continue
+            described = describe(media_type, raw)
+            if described is None:
+                continue
+            media_id, titles, year, popularity = described
+            index.add(media_id, titles, year, popularity)
+            self._pending[f"{media_type}:{media_id}"] = {
+                "media_type": media_type,
+                "media_id": media_id,
+                "titles": titles,
+                "year": year,
+                "popularity": popularity,
+                "data": raw,
+            }
+
+    async def lookup(self, media_type: str, title: str) -> Optional[dict]:
+        """
+        Média brut correspondant à `title` dans le catalogue local, ou None (recherche amont nécessaire).
+        """
+        base, year = split_title_year(title)
+        match = self.indexes[media_type].search(base, year)
+        if match is None:
+            self.misses += 1
+            return None
+        key = f"{media_type}:{match[0]}"
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.hits += 1
+            return pending["data"]
+        try:
+            doc = await mongo.catalog_collection.find_one({"_id": key}, {"data": 1})
+        except Exception as e:
+            logger.warning("Lecture Mongo du catalogue impossible", extra={"key": key, "error": repr(e)})
+            doc = None
+        if doc is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return doc["data"]
+
+    async def load(self) -> None:
+        """
+        Charge l'index en mémoire depuis Mongo (les médias les plus populaires d'abord).
+        """
+        for media_type, index in self.indexes.items():
+            cursor = mongo.catalog_collection.find(
+                {"media_type": media_type}, {"media_id": 1, "titles": 1, "year": 1, "popularity": 1}
+            ).sort("popularity", -1).limit(index.max_items)
+            loaded = []
+            async for doc in cursor:
+                loaded.append(doc)
+            # Insertion du moins populaire au plus populaire : l'éviction retire d'abord les moins populaires
+            for doc in reversed(loaded):
+                if doc["media_id"] not in index:
+                    index.add(doc["media_id"], doc["titles"], doc.get("year"), doc.get("popularity", 0))
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        now = datetime.now(timezone.utc)
+        operations = [
+            UpdateOne({"_id": key}, {"$set": {**doc, "updated_at": now}}, upsert=True)
+            for key, doc in pending.items()
+        ]
+        try:
+            await mongo.catalog_collection.bulk_write(operations, ordered=False)
+        except Exception as e:
+            logger.warning("Écriture Mongo du catalogue impossible", extra={"count": len(operations), "error": repr(e)})
+            # Remis en attente pour le prochain flush (sans écraser des observations plus récentes)
+            self._pending = {**pending, **self._pending}
+
+    async def run(self) -> None:
+        """
+        Chargement initial puis écriture périodique des observations, lancés dans le lifespan.
+        """
+        try:
+            await self.load()
+        except Exception as e:
+            logger.warning("Chargement du catalogue impossible, index construit au fil des requêtes", extra={"error": repr(e)})
+        while True:
+            await asyncio.sleep(CATALOG_FLUSH_INTERVAL)
+            await self.flush()
+
+
+catalog = Catalog(CATALOG_INDEX_SIZE)
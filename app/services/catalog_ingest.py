@@ -0,0 +1,84 @@
+import logging
+import asyncio
+from .http_client import get_client, close_http_clients
+from .catalog import catalog
+from ..db import mongo
+from ..config import TMDB_API_KEY, RAWG_API_KEY, CATALOG_INGEST_INTERVAL, CATALOG_INGEST_PAGES
+from .log import configure_logging, shutdown_logging
+
+logger = logging.getLogger(__name__)
+
+
+async def _tmdb_popular(media_type: str, page: int) -> list[dict]:
+    params = {"api_key": TMDB_API_KEY, "language": "fr-FR", "page": page}
+    r = await get_client("tmdb").get(f"/{media_type}/popular", params=params)
+    r.raise_for_status()
+    return r.json().get("results", [])
+
+
+async def _rawg_popular(page: int) -> list[dict]:
+    params = {"key": RAWG_API_KEY, "ordering": "-added", "page": page, "page_size": 40}
+    r = await get_client("rawg").get("/games", params=params)
+    r.raise_for_status()
+    return r.json().get("results", [])
+
+
+async def _openlibrary_trending(page: int) -> list[dict]:
+    r = await get_client("openlibrary").get("/trending/weekly.json", params={"page": page, "limit": 50})
+    r.raise_for_status()
+    works = r.json().get("works", [])
+    for work in works:
+        work["olid"] = work.get("key", "").replace("/works/", "")
+    return works
+
+
+async def ingest_popular(pages: int = CATALOG_INGEST_PAGES) -> int:
+    """
+    Ajoute au catalogue local les `pages` premières pages populaires de chaque fournisseur.
+    Séquentiel (quotas amont) ; une page en échec n'interrompt pas l'ingestion.
+    """
+    sources = {
+        "movie": lambda page: _tmdb_popular("movie", page),
+        "tv": lambda page: _tmdb_popular("tv", page),
+        "game": _rawg_popular,
+        "book": _openlibrary_trending,
+    }
+    ingested = 0
+    for media_type, fetch in sources.items():
+        for page in range(1, pages + 1):
+            try:
+                items = await fetch(page)
+            except Exception as e:
+                logger.warning("Ingestion du catalogue impossible", extra={"media_type": media_type, "page": page, "error": repr(e)})
+                break
+            catalog.observe(media_type, items)
+            ingested += len(items)
+            if not items:
+                break
+    await catalog.flush()
+    return ingested
+
+
+async def run() -> None:
+    """
+    Ingestion périodique des pages populaires, lancée dans le lifespan de l'application.
+    """
+    while True:
+        await ingest_popular()
+        await asyncio.sleep(CATALOG_INGEST_INTERVAL)
+
+
+async def main():
+    configure_logging()
+    await mongo.connect_mongo()
+    try:
+        await mongo.ensure_indexes()
+        logger.info("Ingestion du catalogue terminée", extra={"count": await ingest_popular()})
+    finally:
+        await close_http_clients()
+        mongo.close_mongo()
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,211 @@
+import asyncio
+import logging
+from array import array
+from typing import Optional
+import numpy as np
+from scipy import sparse
+from ..schemas.media import MediaType
+from ..db import mongo
+from ..config import COLLABORATIVE_MIN_SUPPORT
+
+logger = logging.getLogger(__name__)
+
+
+def _build_matrix(
+    base: sparse.csr_matrix, rows: array, cols: array, removed: set[tuple[int, int]], shape: tuple[int, int]
+) -> tuple[sparse.csr_matrix, sparse.csc_matrix, np.ndarray]:
+    """
+    Nouvelle matrice (CSR, CSC, popularité par média) : `base` plus les ajouts, moins les retraits.
+    Exécutée dans un thread ; ne touche qu'à ses arguments.
+    """
+    base = base.copy()
+    base.resize(shape)
+    added = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32),
+         (np.array(rows, dtype=np.int32), np.array(cols, dtype=np.int32))),
+        shape=shape,
+    )
+    matrix = (base + added).minimum(1).tocsr()
+    if removed:
+        removed_rows, removed_cols = zip(*removed)
+        removed_matrix = sparse.csr_matrix(
+            (np.ones(len(removed_rows), dtype=np.float32), (removed_rows, removed_cols)), shape=shape
+        )
+        matrix = (matrix - matrix.multiply(removed_matrix)).tocsr()
+        matrix.eliminate_zeros()
+    csc = matrix.tocsc()
+    return matrix, csc, np.asarray(csc.sum(axis=0)).ravel()
+
+
+class ItemItemModel:
+    """
+    Filtrage collaboratif item-item d'un type de média ("ceux qui ont aimé X ont aussi aimé").
+    - Ids utilisateurs / médias convertis en entiers compacts
+    - Matrice creuse binaire utilisateurs x médias (CSR/CSC, int32/float32)
+    - Likes ajoutés ou retirés incrémentalement, intégrés par une reconstruction en tâche de fond
+      (thread) substituée à la matrice courante ; les requêtes utilisent la dernière matrice construite
+    """
+
+    def __init__(self):
+        self._user_index: dict[str, int] = {}
+        self._item_index: dict[str, int] = {}
+        self._item_ids: list[str] = []
+        self._base = sparse.csr_matrix((0, 0), dtype=np.float32)
+        self._added_rows = array("i")
+        self._added_cols = array("i")
+        self._removed: set[tuple[int, int]] = set()
+        self._csc: Optional[sparse.csc_matrix] = None
+        self._popularity: Optional[np.ndarray] = None
+        self._compaction: Optional[asyncio.Task] = None
+
+    def _user(self, user_id: str) -> int:
+        if user_id not in self._user_index:
+            self._user_index[user_id] = len(self._user_index)
+        return self._user_index[user_id]
+
+    def _item(self, media_id: str) -> int:
+        if media_id not in self._item_index:
+            self._item_index[media_id] = len(self._item_ids)
+            self._item_ids.append(media_id)
+        return self._item_index[media_id]
+
+    def add_like(self, user_id: str, media_id: str) -> None:
+        user, item = self._user(user_id), self._item(str(media_id))
+        self._removed.discard((user, item))
+        self._added_rows.append(user)
+        self._added_cols.append(item)
+
+    def remove_like(self, user_id: str, media_id: str) -> None:
+        user = self._user_index.get(user_id)
+        item = self._item_index.get(str(media_id))
+        if user is None or item is None:
+            return
+        self._removed.add((user, item))
+
+    def dirty(self) -> bool:
+        return bool(self._added_rows) or bool(self._removed)
+
+    async def compact(self) -> None:
+        """
+        Intègre les ajouts/retraits en attente : la matrice est reconstruite hors de la boucle
+        d'événements puis substituée à l'ancienne. Les likes arrivant pendant la reconstruction
+        sont intégrés au tour suivant.
+        """
+        while self.dirty() or self._csc is None:
+            shape = (len(self._user_index), len(self._item_ids))
+            rows, cols, removed = self._added_rows, self._added_cols, self._removed
+            self._added_rows, self._added_cols, self._removed = array("i"), array("i"), set()
+            self._base, self._csc, self._popularity = await asyncio.to_thread(
+                _build_matrix, self._base, rows, cols, removed, shape
+            )
+
+    def schedule_compaction(self) -> None:
+        """
+        Lance une reconstruction en tâche de fond s'il y a des changements et qu'aucune n'est en cours.
+        """
+        if (self._compaction is not None and not self._compaction.done()) or not (self.dirty() or self._csc is None):
+            return
+        self._compaction = asyncio.get_running_loop().create_task(self.compact())
+        self._compaction.add_done_callback(_log_compaction_error)
+
+    def similar_items(self, media_ids: list[str], k: int, exclude_ids: set[str]) -> list[str]:
+        """
+        Top-k des médias co-aimés avec `media_ids` (cosinus sur les co-occurrences).
+        """
+        self.schedule_compaction()
+        matrix = self._csc
+        if matrix is None:
+            return []
+        # Médias apparus depuis la dernière reconstruction : absents de la matrice courante
+        n_items = matrix.shape[1]
+        query = [self._item_index[str(m)] for m in media_ids if self._item_index.get(str(m), n_items) < n_items]
+        if not query:
+            return []
+        # Poids de chaque utilisateur = nombre de médias de la requête qu'il a aimés
+        user_weights = np.asarray(matrix[:, query].sum(axis=1)).ravel()
+        if not user_weights.any():
+            return []
+        cooccurrence = matrix.T @ user_weights
+        support = cooccurrence.copy()
+        norms = np.sqrt(self._popularity * self._popularity[query].sum())
+        scores = np.divide(cooccurrence, norms, out=np.zeros_like(cooccurrence), where=norms > 0)
+        scores[query] = 0
+        excluded = [self._item_index[str(m)] for m in exclude_ids if self._item_index.get(str(m), n_items) < n_items]
+        scores[excluded] = 0
+        scores[support < COLLABORATIVE_MIN_SUPPORT] = 0
+        candidates = np.flatnonzero(scores)
+        if not len(candidates):
+            return []
+        k = min(k, len(candidates))
+        top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [self._item_ids[i] for i in top]
+
+
+def _log_compaction_error(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("Reconstruction de la matrice collaborative impossible", extra={"error": repr(task.exception())})
+
+
+class CollaborativeFilter:
+    """
+    Un modèle item-item par type de média, chargé depuis la collection `interactions`
+    puis tenu à jour par les likes.
+    """
+
+    def __init__(self):
+        self.models = {media_type.value: ItemItemModel() for media_type in MediaType}
+        # Likes/unlikes reçus pendant un chargement, rejoués sur les nouveaux modèles
+        self._pending_updates: Optional[list[tuple[str, str, str, str]]] = None
+
+    async def load(self) -> None:
+        """
+        Construit les modèles à partir de toutes les interactions (lancé dans le lifespan).
+        """
+        models = {media_type.value: ItemItemModel() for media_type in MediaType}
+        self._pending_updates = []
+        try:
+            cursor = mongo.interactions_collection.find({}, {"user_id": 1, "liked_ids": 1})
+            async for record in cursor:
+                liked = record.get("liked_ids") or {}
+                if isinstance(liked, list):
+                    liked = {"movie": liked}
+                for media_type, media_ids in liked.items():
+                    if media_type in models:
+                        for media_id in media_ids:
+                            models[media_type].add_like(record["user_id"], media_id)
+            for model in models.values():
+                await model.compact()
+            # Pas d'await entre le rejeu et la substitution : aucune mise à jour perdue
+            for operation, user_id, media_type, media_id in self._pending_updates:
+                getattr(models[media_type], operation)(user_id, media_id)
+            self.models = models
+        finally:
+            self._pending_updates = None
+
+    async def run(self) -> None:
+        """
+        Chargement initial, lancé dans le lifespan de l'application ; en cas d'échec, les
+        modèles se construisent au fil des likes.
+        """
+        try:
+            await self.load()
+        except Exception as e:
+            logger.warning("Chargement du filtrage collaboratif impossible, modèles construits au fil des likes", extra={"error": repr(e)})
+
+    def add_like(self, user_id: str, media_type: str, media_id: str) -> None:
+        self._update("add_like", user_id, media_type, media_id)
+
+    def remove_like(self, user_id: str, media_type: str, media_id: str) -> None:
+        self._update("remove_like", user_id, media_type, media_id)
+
+    def _update(self, operation: str, user_id: str, media_type: str, media_id: str) -> None:
+        getattr(self.models[media_type], operation)(user_id, media_id)
+        if self._pending_updates is not None:
+            self._pending_updates.append((operation, user_id, media_type, media_id))
+
+    def similar_items(self, media_type: str, media_ids: list[str], k: int, exclude_ids: set[str]) -> list[str]:
+        return self.models[media_type].similar_items(media_ids, k, exclude_ids)
+
+
+collaborative_filter = CollaborativeFilter()
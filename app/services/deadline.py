@@ -0,0 +1,76 @@
+import time
+from contextlib import contextmanager
+from contextvars import Context, ContextVar, copy_context
+from typing import Iterator, Optional
+
+# Échéance (time.monotonic()) de la requête en cours ; None hors requête (tâches de fond, scripts)
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[None]:
+    """
+    Fixe l'échéance du contexte courant (sans jamais repousser une échéance déjà plus proche).
+    Les tâches créées dans ce contexte (asyncio.create_task, gather) en héritent.
+    """
+    if seconds is None:
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def without_deadline() -> Context:
+    """
+    Copie du contexte courant sans échéance, pour un calcul partagé entre plusieurs requêtes
+    (ou tâches de fond) : chacune borne ensuite sa propre attente avec remaining().
+    """
+    context = copy_context()
+    context.run(_deadline.set, None)
+    return context
+
+
+def remaining() -> Optional[float]:
+    """
+    Secondes restantes avant l'échéance de la requête (None si aucune échéance).
+    """
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def expired() -> bool:
+    budget = remaining()
+    return budget is not None and budget <= 0
+
+
+def budget(default: float) -> float:
+    """
+    Délai à accorder à une opération : `default`, borné par le temps restant de la requête.
+    """
+    budget = remaining()
+    return default if budget is None else max(0.0, min(default, budget))
+
+
+class DeadlineMiddleware:
+    """
+    Middleware ASGI : chaque requête HTTP reçoit une échéance de `seconds`, visible par
+    tous les appels amont qu'elle déclenche. Les routes streamées (`exclude_suffixes`)
+    en sont exemptées : elles émettent leurs résultats au fil de l'eau.
+    """
+
+    def __init__(self, app, seconds: float, exclude_suffixes: tuple[str, ...] = ()):
+        self.app = app
+        self.seconds = seconds
+        self.exclude_suffixes = exclude_suffixes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].endswith(self.exclude_suffixes):
+            await self.app(scope, receive, send)
+            return
+        with deadline_scope(self.seconds):
+            await self.app(scope, receive, send)
@@ -0,0 +1,65 @@
+import hashlib
+import math
+from typing import Iterable
+from .cache import normalize_title
+from ..config import EXCLUSION_BLOOM_THRESHOLD, EXCLUSION_BLOOM_ERROR_RATE
+
+
+class BloomFilter:
+    """
+    Filtre de Bloom (double hachage blake2b) : appartenance approximative sans faux négatifs.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value: str) -> Iterable[int]:
+        digest = hashlib.blake2b(value.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, value: str) -> None:
+        for position in self._positions(value):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class ExclusionIndex:
+    """
+    Médias à ne pas recommander à un utilisateur (déjà likés ou dislikés), construit une fois
+    par requête et consulté avant toute hydratation (search_media, from_game, from_book).
+    - Par id et par titre normalisé
+    - Ensembles Python, ou filtre de Bloom au-delà de EXCLUSION_BLOOM_THRESHOLD éléments
+    """
+
+    def __init__(self, media_ids: Iterable[str], titles: Iterable[str]):
+        media_ids = [str(media_id) for media_id in media_ids]
+        titles = [t for t in (normalize_title(title) for title in titles if title) if t]
+        if len(media_ids) + len(titles) > EXCLUSION_BLOOM_THRESHOLD:
+            self._ids = BloomFilter(len(media_ids), EXCLUSION_BLOOM_ERROR_RATE)
+            self._titles = BloomFilter(len(titles), EXCLUSION_BLOOM_ERROR_RATE)
+            for media_id in media_ids:
+                self._ids.add(media_id)
+            for title in titles:
+                self._titles.add(title)
+        else:
+            self._ids = set(media_ids)
+            self._titles = set(titles)
+        self.skipped = 0
+
+    def excludes_id(self, media_id) -> bool:
+        excluded = str(media_id) in self._ids
+        self.skipped += excluded
+        return excluded
+
+    def excludes_title(self, title: str) -> bool:
+        excluded = normalize_title(str(title)) in self._titles
+        self.skipped += excluded
+        return excluded
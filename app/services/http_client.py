@@ -0,0 +1,130 @@
+import httpx
+from dataclasses import dataclass
+from typing import Optional
+from .resilience import ResilientTransport, get_breaker, get_bucket, get_latency
+from ..config import (
+    TMDB_BASE_URL, RAWG_BASE_URL, OPENLIBRARY_BASE_URL, OPENROUTER_BASE_URL,
+    TMDB_RATE_LIMIT, RAWG_RATE_LIMIT, OPENLIBRARY_RATE_LIMIT, OPENROUTER_RATE_LIMIT,
+)
+
+
+@dataclass(frozen=True)
+class ProviderConfig:
+    """Paramètres de connexion propres à un fournisseur amont."""
+    base_url: str
+    max_connections: int
+    max_keepalive_connections: int
+    connect_timeout: float
+    read_timeout: float
+    rate_per_second: float
+    burst: int
+    http2: bool = False
+
+
+# Les limites et timeouts sont calibrés par fournisseur : OpenRouter répond
+# en plusieurs secondes (génération LLM), les API de métadonnées en quelques
+# centaines de millisecondes. Les débits par défaut suivent les quotas publiés :
+# TMDB ~50 req/s, RAWG (offre gratuite) sans quota par seconde mais mensuel,
+# Open Library ~3 req/s avec User-Agent identifié, OpenRouter (modèles :free) 20 req/min.
+PROVIDERS: dict[str, ProviderConfig] = {
+    "tmdb": ProviderConfig(
+        base_url=TMDB_BASE_URL,
+        max_connections=50,
+        max_keepalive_connections=20,
+        connect_timeout=3.0,
+        read_timeout=5.0,
+        rate_per_second=TMDB_RATE_LIMIT,
+        burst=50,
+        http2=True,
+    ),
+    "rawg": ProviderConfig(
+        base_url=RAWG_BASE_URL,
+        max_connections=20,
+        max_keepalive_connections=10,
+        connect_timeout=3.0,
+        read_timeout=5.0,
+        rate_per_second=RAWG_RATE_LIMIT,
+        burst=10,
+        http2=True,
+    ),
+    "openlibrary": ProviderConfig(
+        base_url=OPENLIBRARY_BASE_URL,
+        max_connections=10,
+        max_keepalive_connections=5,
+        connect_timeout=3.0,
+        read_timeout=10.0,
+        rate_per_second=OPENLIBRARY_RATE_LIMIT,
+        burst=5,
+        http2=False,
+    ),
+    "openrouter": ProviderConfig(
+        base_url=OPENROUTER_BASE_URL,
+        max_connections=20,
+        max_keepalive_connections=10,
+        connect_timeout=3.0,
+        read_timeout=60.0,
+        rate_per_second=OPENROUTER_RATE_LIMIT,
+        burst=5,
+        http2=True,
+    ),
+}
+
+_clients: dict[str, httpx.AsyncClient] = {}
+
+
+def _build_client(name: str, provider: ProviderConfig) -> httpx.AsyncClient:
+    transport = httpx.AsyncHTTPTransport(
+        http2=provider.http2,
+        limits=httpx.Limits(
+            max_connections=provider.max_connections,
+            max_keepalive_connections=provider.max_keepalive_connections,
+        ),
+    )
+    return httpx.AsyncClient(
+        base_url=provider.base_url,
+        # Limiteur, disjoncteur et latences partagés par fournisseur (ils survivent à la recréation du client)
+        transport=ResilientTransport(
+            name,
+            transport,
+            get_bucket(name, provider.rate_per_second, provider.burst),
+            get_breaker(name),
+            get_latency(name),
+        ),
+        timeout=httpx.Timeout(
+            provider.read_timeout,
+            connect=provider.connect_timeout,
+            # Pool saturé : échec rapide plutôt qu'une attente sans borne
+            pool=provider.connect_timeout,
+        ),
+    )
+
+
+async def start_http_clients() -> None:
+    """
+    Ouvre un client HTTP (pool keep-alive) par fournisseur.
+    Appelé au démarrage de l'application (lifespan).
+    """
+    for name, provider in PROVIDERS.items():
+        if name not in _clients:
+            _clients[name] = _build_client(name, provider)
+
+
+async def close_http_clients() -> None:
+    """
+    Ferme proprement les pools de connexions. Appelé à l'arrêt de l'application.
+    """
+    for client in _clients.values():
+        await client.aclose()
+    _clients.clear()
+
+
+def get_client(provider: str) -> httpx.AsyncClient:
+    """
+    Retourne le client partagé d'un fournisseur ('tmdb', 'rawg', 'openlibrary', 'openrouter').
+    Le client est créé à la volée si le lifespan n'a pas été exécuté (scripts, shell).
+    """
+    client: Optional[httpx.AsyncClient] = _clients.get(provider)
+    if client is None:
+        client = _build_client(provider, PROVIDERS[provider])
+        _clients[provider] = client
+    return client
@@ -0,0 +1,82 @@
+import json
+import logging
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+from ..config import LOG_LEVEL, LOG_INFO_SAMPLE_RATE, LOG_DEBUG_SAMPLE_RATE
+
+# Attributs standards d'un LogRecord : tout le reste vient de `extra` et devient un champ JSON
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "sample_rate"}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Une ligne JSON par événement : horodatage, niveau, logger, message et champs `extra`.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Échantillonnage par niveau (les avertissements et erreurs sont toujours conservés) ;
+    un appel peut fixer son propre taux via extra={"sample_rate": 0.01}.
+    """
+
+    def __init__(self, rates: dict[int, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = getattr(record, "sample_rate", None)
+        if rate is None:
+            rate = self.rates.get(record.levelno, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+_listener: Optional[QueueListener] = None
+
+
+def configure_logging(level: str = LOG_LEVEL) -> None:
+    """
+    Journalisation structurée (JSON) des loggers `app.*`. Les événements sont échantillonnés
+    puis mis en file : l'écriture sur stdout se fait dans un thread dédié, hors de la boucle asyncio.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter())
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = QueueHandler(log_queue)
+    handler.addFilter(SamplingFilter({logging.DEBUG: LOG_DEBUG_SAMPLE_RATE, logging.INFO: LOG_INFO_SAMPLE_RATE}))
+    logger = logging.getLogger("app")
+    logger.setLevel(level.upper())
+    logger.addHandler(handler)
+    logger.propagate = False
+    _listener = QueueListener(log_queue, output)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """
+    Vide la file et arrête le thread d'écriture (arrêt de l'application).
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
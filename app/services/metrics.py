@@ -0,0 +1,117 @@
+import time
+from typing import Callable
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from pymongo import monitoring
+
+ROUTE_LATENCY = Histogram(
+    "http_request_duration_seconds", "Durée des requêtes HTTP par route", ["method", "route", "status"],
+)
+UPSTREAM_LATENCY = Histogram(
+    "upstream_request_duration_seconds", "Durée des appels amont (jusqu'aux en-têtes)", ["provider", "status"],
+)
+UPSTREAM_ERRORS = Counter(
+    "upstream_errors_total", "Appels amont en échec ou refusés localement", ["provider", "reason"],
+)
+UPSTREAM_RATE_LIMITED = Counter(
+    "upstream_rate_limited_total", "Réponses 429 des fournisseurs", ["provider"],
+)
+UPSTREAM_HEDGED = Counter(
+    "upstream_hedged_requests_total", "GET doublés après dépassement du p95", ["provider"],
+)
+UPSTREAM_CIRCUIT_OPEN = Gauge(
+    "upstream_circuit_open", "1 si le disjoncteur du fournisseur est ouvert", ["provider"],
+)
+LLM_LATENCY = Histogram(
+    "llm_request_duration_seconds", "Durée des appels au LLM", ["model", "mode"],
+    buckets=(0.5, 1, 2, 4, 8, 16, 32, 64),
+)
+LLM_FIRST_TOKEN = Histogram(
+    "llm_time_to_first_token_seconds", "Délai avant le premier fragment streamé du LLM", ["model"],
+    buckets=(0.25, 0.5, 1, 2, 4, 8, 16),
+)
+LLM_TOKENS = Counter(
+    "llm_tokens_total", "Jetons consommés par le LLM", ["model", "kind"],
+)
+MONGO_LATENCY = Histogram(
+    "mongo_command_duration_seconds", "Durée des commandes Mongo", ["command", "status"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+
+
+def record_llm_usage(model: str, usage: dict) -> None:
+    for kind in ("prompt_tokens", "completion_tokens"):
+        if usage.get(kind):
+            LLM_TOKENS.labels(model, kind.removesuffix("_tokens")).inc(usage[kind])
+
+
+class CacheCollector:
+    """
+    Expose les compteurs des caches (déjà tenus par chaque cache) au moment du scrape :
+    aucun coût sur le chemin des requêtes. Taux de succès : rate(cache_lookups_total{result!="misses"}).
+    """
+
+    def __init__(self):
+        self._sources: dict[str, Callable[[], dict]] = {}
+
+    def register(self, name: str, stats: Callable[[], dict]) -> None:
+        self._sources[name] = stats
+
+    def collect(self):
+        lookups = CounterMetricFamily("cache_lookups", "Consultations des caches par résultat", labels=["cache", "result"])
+        entries = GaugeMetricFamily("cache_entries", "Entrées en mémoire par cache", labels=["cache"])
+        for name, stats in self._sources.items():
+            for result, value in stats().items():
+                if result == "memory_size":
+                    entries.add_metric([name], value)
+                else:
+                    lookups.add_metric([name, result], value)
+        yield lookups
+        yield entries
+
+
+cache_collector = CacheCollector()
+REGISTRY.register(cache_collector)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """
+    Durée de chaque commande Mongo (find, update, insert...), mesurée par le driver.
+    """
+
+    def started(self, event) -> None:
+        pass
+
+    def succeeded(self, event) -> None:
+        MONGO_LATENCY.labels(event.command_name, "ok").observe(event.duration_micros / 1e6)
+
+    def failed(self, event) -> None:
+        MONGO_LATENCY.labels(event.command_name, "error").observe(event.duration_micros / 1e6)
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI : latence de chaque requête HTTP par route (modèle de chemin, pas l'URL brute).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            ROUTE_LATENCY.labels(scope["method"], route, str(status)).observe(time.perf_counter() - started)
@@ -0,0 +1,113 @@
+import logging
+import asyncio
+import random
+from typing import Sequence
+from .tmdb_client import build_prompt_from_mood, search_media
+from .openrouter_client import query_openrouter, parse_llm_titles
+from .serialization import EncodedPayload
+from .http_client import PROVIDERS
+from .resilience import get_bucket
+from ..schemas.interaction import Mood
+from ..schemas.media import MediaRecommendation, MediaType
+from ..config import MOOD_CACHE_VARIANTS, MOOD_CACHE_REFRESH_INTERVAL, MOOD_CACHE_WARMUP_HEADROOM
+
+logger = logging.getLogger(__name__)
+
+
+async def generate_mood_recommendations(
+    media_type: str, mood: str, avoid: Sequence[str] = ()
+) -> list[MediaRecommendation]:
+    """
+    Interroge le LLM pour une ambiance (hors titres `avoid`) puis résout les titres proposés.
+    Lève KeyError/IndexError/ValueError si la réponse du LLM n'est pas exploitable.
+    """
+    prompt = build_prompt_from_mood(media_type, mood, avoid)
+    llm_response = await query_openrouter(prompt)
+    media_titles = parse_llm_titles(llm_response)
+    results = await asyncio.gather(
+        *(search_media(media_type, title) for title in media_titles), return_exceptions=True
+    )
+    recommendations = []
+    for media_details in results:
+        if not media_details or isinstance(media_details, Exception):
+            continue
+        recommendations.append(MediaRecommendation.from_media(media_details, MediaType(media_type)))
+    return recommendations
+
+
+class MoodRecommendationCache:
+    """
+    Recommandations par ambiance pré-calculées : plusieurs variantes générées par le LLM
+    pour chaque couple (media_type, mood), tirées au hasard à chaque requête.
+    Chaque variante est gardée sous forme de corps JSON pré-sérialisé et compressé.
+    """
+
+    def __init__(self, variants: int, interval: float):
+        self.variants = variants
+        self.interval = interval
+        self._data: dict[tuple[str, str], list[EncodedPayload]] = {}
+
+    @staticmethod
+    def keys() -> list[tuple[str, str]]:
+        return [(media_type.value, mood.value) for media_type in MediaType for mood in Mood]
+
+    async def _wait_for_llm_capacity(self) -> None:
+        """
+        Attend que le quota OpenRouter ait de la marge : le préchauffage ne consomme que des
+        jetons inutilisés et laisse `MOOD_CACHE_WARMUP_HEADROOM` jetons aux requêtes des utilisateurs.
+        """
+        provider = PROVIDERS["openrouter"]
+        bucket = get_bucket("openrouter", provider.rate_per_second, provider.burst)
+        needed = min(float(provider.burst), MOOD_CACHE_WARMUP_HEADROOM)
+        while (available := bucket.available()) < needed:
+            await asyncio.sleep((needed - available) / bucket.rate)
+
+    async def refresh_all(self) -> None:
+        """
+        Régénère les variantes de toutes les clés, une variante par clé à chaque passage
+        (chaque clé est servie au plus tôt), au rythme du quota du LLM.
+        Les anciennes variantes d'une clé sont remplacées dès sa première nouvelle variante,
+        et conservées si le LLM n'en produit aucune.
+        Chaque variante exclut les titres des précédentes (prompt, puis dédoublonnage par id).
+        """
+        fresh: dict[tuple[str, str], list[EncodedPayload]] = {key: [] for key in self.keys()}
+        proposed: dict[tuple[str, str], dict[str, str]] = {key: {} for key in self.keys()}
+        for _ in range(self.variants):
+            for media_type, mood in self.keys():
+                seen = proposed[(media_type, mood)]
+                await self._wait_for_llm_capacity()
+                try:
+                    recommendations = await generate_mood_recommendations(media_type, mood, list(seen.values()))
+                except Exception as e:
+                    logger.warning("Génération des recommandations d'ambiance impossible", extra={"media_type": media_type, "mood": mood, "error": repr(e)})
+                    continue
+                recommendations = list({rec.id: rec for rec in recommendations if rec.id not in seen}.values())
+                seen.update((rec.id, rec.title) for rec in recommendations)
+                if recommendations:
+                    variants = fresh[(media_type, mood)]
+                    variants.append(EncodedPayload.build(recommendations))
+                    self._data[(media_type, mood)] = variants
+
+    async def get(self, media_type: str, mood: str) -> EncodedPayload:
+        """
+        Retourne une variante en cache ; si le cache n'est pas encore chaud pour cette clé,
+        la calcule une fois à la volée.
+        """
+        variants = self._data.get((media_type, mood))
+        if variants:
+            return random.choice(variants)
+        payload = EncodedPayload.build(await generate_mood_recommendations(media_type, mood))
+        if payload.body != b"[]":
+            self._data.setdefault((media_type, mood), []).append(payload)
+        return payload
+
+    async def run(self) -> None:
+        """
+        Boucle de préchauffage puis de rafraîchissement, lancée dans le lifespan de l'application.
+        """
+        while True:
+            await self.refresh_all()
+            await asyncio.sleep(self.interval)
+
+
+mood_cache = MoodRecommendationCache(MOOD_CACHE_VARIANTS, MOOD_CACHE_REFRESH_INTERVAL)
@@ -1,19 +1,36 @@
-import requests
+from .http_client import get_client
+from .cache import metadata_cache, split_title_year
+from .catalog import catalog, rank_results
 
-OPENLIBRARY_BASE_URL = "https://openlibrary.org"
-
-def search_book(title: str):
-    r = requests.get(f"{OPENLIBRARY_BASE_URL}/search.json", params={"q": title})
+async def search_book(title: str):
+    query, _ = split_title_year(title)
+    r = await get_client("openlibrary").get("/search.json", params={"q": query.strip() or title})
     r.raise_for_status()
     results = r.json().get("docs", [])
-    if results:
-        # On retourne le premier résultat pertinent (OLID)
-        doc = results[0]
+    for doc in results:
         doc["olid"] = doc.get("key", "").replace("/works/", "")
-        return doc
-    return None
+    catalog.observe("book", results)
+    # Meilleure correspondance titre/année (OLID) plutôt que le premier résultat
+    return rank_results("book", title, results)
+
+async def get_book_info(olid: str):
+    return await metadata_cache.get_or_fetch_media(
+        "book", olid, None, lambda: _fetch_book_info(olid)
+    )
 
-def get_book_info(olid: str):
-    r = requests.get(f"{OPENLIBRARY_BASE_URL}/works/{olid}.json")
+async def _fetch_book_info(olid: str):
+    r = await get_client("openlibrary").get(f"/works/{olid}.json")
     r.raise_for_status()
-    return r.json() 
\ No newline at end of file
+    return r.json()
+
+async def search_books(query: str, limit: int = 10) -> list[dict]:
+    """
+    Recherche des livres (auteur, sujet, titre) et retourne la liste des documents trouvés.
+    """
+    r = await get_client("openlibrary").get("/search.json", params={"q": query, "limit": limit})
+    r.raise_for_status()
+    docs = r.json().get("docs", [])
+    for doc in docs:
+        doc["olid"] = doc.get("key", "").replace("/works/", "")
+    catalog.observe("book", docs)
+    return docs
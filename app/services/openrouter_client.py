@@ -1,7 +1,22 @@
-import requests
+import hashlib
+import json
+import time
+from contextlib import aclosing
+from typing import AsyncIterator
 from ..config import OPENROUTER_API_KEY
+from .http_client import get_client
+from .singleflight import upstream_flight
+from .metrics import LLM_LATENCY, LLM_FIRST_TOKEN, record_llm_usage
 
-def query_openrouter(prompt: str, model: str = "deepseek/deepseek-r1-distill-llama-70b:free"):
+async def query_openrouter(prompt: str, model: str = "deepseek/deepseek-r1-distill-llama-70b:free"):
+    # Un prompt identique déjà en cours de génération n'est pas renvoyé au LLM
+    prompt_digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    return await upstream_flight.do(
+        ("openrouter", model, prompt_digest),
+        lambda: _post_openrouter(prompt, model),
+    )
+
+async def _post_openrouter(prompt: str, model: str):
     headers = {
         "Authorization": f"Bearer {OPENROUTER_API_KEY}",
         "Content-Type": "application/json"
@@ -10,6 +25,189 @@ def query_openrouter(prompt: str, model: str = "deepseek/deepseek-r1-distill-lla
         "model": model,
         "messages": [{"role": "user", "content": prompt}]
     }
-    res = requests.post("https://openrouter.ai/api/v1/chat/completions", json=payload, headers=headers)
+    started = time.perf_counter()
+    res = await get_client("openrouter").post("/chat/completions", json=payload, headers=headers)
     res.raise_for_status()
-    return res.json()
+    data = res.json()
+    LLM_LATENCY.labels(model, "complete").observe(time.perf_counter() - started)
+    record_llm_usage(model, data.get("usage") or {})
+    return data
+
+async def stream_openrouter(prompt: str, model: str = "deepseek/deepseek-r1-distill-llama-70b:free") -> AsyncIterator[str]:
+    """
+    Variante streamée (SSE) de query_openrouter : produit les fragments de texte au fil de la génération.
+    Les jetons de raisonnement (delta.reasoning) et les commentaires SSE sont ignorés.
+    """
+    headers = {
+        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+        "Content-Type": "application/json"
+    }
+    payload = {
+        "model": model,
+        "messages": [{"role": "user", "content": prompt}],
+        "stream": True,
+        # Dernier événement du flux : consommation de jetons
+        "usage": {"include": True}
+    }
+    started = time.perf_counter()
+    first_fragment = True
+    try:
+        async with get_client("openrouter").stream("POST", "/chat/completions", json=payload, headers=headers) as res:
+            res.raise_for_status()
+            async for line in res.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    chunk = json.loads(data)
+                except ValueError:
+                    continue
+                if "error" in chunk:
+                    raise ValueError(f"Erreur OpenRouter en cours de génération : {chunk['error']}")
+                if chunk.get("usage"):
+                    record_llm_usage(model, chunk["usage"])
+                for choice in chunk.get("choices", []):
+                    content = (choice.get("delta") or {}).get("content")
+                    if content:
+                        if first_fragment:
+                            LLM_FIRST_TOKEN.labels(model).observe(time.perf_counter() - started)
+                            first_fragment = False
+                        yield content
+    finally:
+        LLM_LATENCY.labels(model, "stream").observe(time.perf_counter() - started)
+
+class JsonArrayStreamParser:
+    """
+    Parseur incrémental du tableau JSON de titres renvoyé par le LLM.
+    - feed() accepte des fragments arbitraires et retourne les titres dont le guillemet fermant vient d'arriver
+    - Ignore le texte avant le tableau (introduction, balise ```json) et les blocs <think>…</think>
+    - Un tableau sans aucune chaîne (ex. « [1] » dans l'introduction) est ignoré et la recherche continue
+    """
+
+    def __init__(self):
+        self._pending = ""
+        self._in_think = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._buffer: list[str] = []
+        self._found = 0
+        self.started = False
+        self.closed = False
+        # Au moins un tableau refermé, même sans titre (« [] » est une réponse valide)
+        self.array_seen = False
+
+    def feed(self, text: str) -> list[str]:
+        titles = []
+        text = self._pending + text
+        self._pending = ""
+        i = 0
+        while i < len(text) and not self.closed:
+            char = text[i]
+            if self._in_string:
+                self._buffer.append(char)
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    title = self._decode("".join(self._buffer))
+                    self._buffer = []
+                    if self._depth == 1 and title:
+                        titles.append(title)
+                        self._found += 1
+                i += 1
+                continue
+            if self._depth == 0 and char == "<":
+                # Balises <think> / </think>, éventuellement coupées entre deux fragments
+                tag = "</think>" if self._in_think else "<think>"
+                candidate = text[i:i + len(tag)]
+                if candidate == tag:
+                    self._in_think = not self._in_think
+                    i += len(tag)
+                    continue
+                if tag.startswith(candidate):
+                    self._pending = text[i:]
+                    break
+            if self._in_think:
+                i += 1
+                continue
+            if char == "[":
+                self._depth += 1
+                self.started = True
+            elif char == "]" and self._depth:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.array_seen = True
+                    if self._found:
+                        self.closed = True
+                    else:
+                        self.started = False
+            elif char == '"' and self._depth:
+                self._in_string = True
+                self._buffer = ['"']
+            i += 1
+        return titles
+
+    @staticmethod
+    def _decode(raw: str) -> str:
+        try:
+            return json.loads(raw).strip()
+        except ValueError:
+            return raw[1:-1].strip()
+
+async def stream_llm_titles(prompt: str, model: str = "deepseek/deepseek-r1-distill-llama-70b:free") -> AsyncIterator[str]:
+    """
+    Produit chaque titre proposé par le LLM dès qu'il est complet, sans attendre la fin de la génération.
+    Lève ValueError si la réponse ne contient aucun tableau de titres.
+    """
+    parser = JsonArrayStreamParser()
+    found = False
+    # aclosing : la connexion est fermée (génération interrompue) dès que le tableau est complet
+    async with aclosing(stream_openrouter(prompt, model)) as fragments:
+        async for fragment in fragments:
+            for title in parser.feed(fragment):
+                found = True
+                yield title
+            if parser.closed:
+                break
+    if not found:
+        raise ValueError("La réponse de l'IA ne contient pas de liste de titres.")
+
+def parse_llm_titles(llm_response: dict) -> list[str]:
+    """
+    Extrait la liste de titres (tableau JSON) de la réponse du LLM, en ignorant le texte autour
+    (balises de code, introduction, blocs <think>).
+    Lève KeyError/IndexError/ValueError si la réponse n'est pas exploitable.
+    """
+    content_str = llm_response['choices'][0]['message']['content']
+    parser = JsonArrayStreamParser()
+    media_titles = parser.feed(content_str)
+    if not parser.started and not parser.array_seen and not media_titles:
+        raise ValueError("La réponse de l'IA n'est pas une liste.")
+    return media_titles
+
+def parse_llm_json_object(llm_response: dict) -> dict[str, list]:
+    """
+    Extrait l'objet JSON {type: [titres]} de la réponse du LLM, en ignorant le texte autour
+    (balises de code, introduction). Les sections qui ne sont pas des listes sont ignorées.
+    Lève KeyError/IndexError/ValueError si aucun objet JSON n'est exploitable.
+    """
+    content_str = llm_response['choices'][0]['message']['content']
+    if "</think>" in content_str:
+        content_str = content_str.rsplit("</think>", 1)[1]
+    start = content_str.find("{")
+    end = content_str.rfind("}")
+    if start == -1 or end <= start:
+        raise ValueError("La réponse de l'IA ne contient pas d'objet JSON.")
+    data = json.loads(content_str[start:end + 1])
+    if not isinstance(data, dict):
+        raise ValueError("La réponse de l'IA n'est pas un objet.")
+    return {
+        str(key).strip().lower(): [t for t in value if isinstance(t, str)]
+        for key, value in data.items()
+        if isinstance(value, list)
+    }
@@ -1,49 +1,68 @@
-import requests
+import logging
 from ..config import RAWG_API_KEY
+from .http_client import get_client
+from .cache import metadata_cache
+from .singleflight import upstream_flight
+from .catalog import catalog, rank_results
 
-RAWG_BASE_URL = "https://api.rawg.io/api"
+logger = logging.getLogger(__name__)
 
-def search_game(title: str):
+async def search_game(title: str):
     params = {"key": RAWG_API_KEY, "search": title}
-    r = requests.get(f"{RAWG_BASE_URL}/games", params=params)
+    r = await get_client("rawg").get("/games", params=params)
     r.raise_for_status()
     results = r.json().get("results", [])
-    if results:
-        return results[0]  # Premier résultat pertinent
-    return None
+    catalog.observe("game", results)
+    # Meilleure correspondance titre/année plutôt que le premier résultat
+    return rank_results("game", title, results)
 
-def get_game_info(game_id: int):
+async def get_game_info(game_id: int):
+    return await metadata_cache.get_or_fetch_media(
+        "game", game_id, None, lambda: _fetch_game_info(game_id)
+    )
+
+async def _fetch_game_info(game_id: int):
     params = {"key": RAWG_API_KEY}
-    r = requests.get(f"{RAWG_BASE_URL}/games/{game_id}", params=params)
+    r = await get_client("rawg").get(f"/games/{game_id}", params=params)
     r.raise_for_status()
-    return r.json()
+    data = r.json()
+    catalog.observe("game", [data])
+    return data
 
-def get_top_games(year: int = None, ordering: str = "-added", page_size: int = 10):
+async def get_top_games(year: int = None, ordering: str = "-added", page_size: int = 10):
     """
     Récupère les jeux les plus populaires d'une année donnée (par défaut année en cours), triés par popularité (ajouts utilisateurs).
     """
     import datetime
     if year is None:
         year = datetime.datetime.now().year
+    return await upstream_flight.do(
+        ("rawg", "top", year, ordering, page_size),
+        lambda: _fetch_top_games(year, ordering, page_size),
+    )
+
+async def _fetch_top_games(year: int, ordering: str, page_size: int):
     params = {
         "key": RAWG_API_KEY,
         "dates": f"{year}-01-01,{year}-12-31",
         "ordering": ordering,
         "page_size": page_size
     }
-    url = f"{RAWG_BASE_URL}/games"
-    print(f"[RAWG] get_top_games URL: {url} params: {params}")
-    r = requests.get(url, params=params)
+    url = "/games"
+    logger.debug("RAWG get_top_games", extra={"year": year, "ordering": ordering, "page_size": page_size})
+    r = await get_client("rawg").get(url, params=params)
     r.raise_for_status()
     return r.json().get("results", [])
 
-def get_suggested_games(game_id: int, page_size: int = 10):
+async def get_suggested_games(game_id: int, page_size: int = 10):
     """
     Récupère les jeux similaires à un jeu donné via RAWG.
     """
     params = {"key": RAWG_API_KEY, "page_size": page_size}
-    url = f"{RAWG_BASE_URL}/games/{game_id}/suggested"
-    print(f"[RAWG] get_suggested_games URL: {url} params: {params}")
-    r = requests.get(url, params=params)
+    url = f"/games/{game_id}/suggested"
+    logger.debug("RAWG get_suggested_games", extra={"game_id": game_id, "page_size": page_size})
+    r = await get_client("rawg").get(url, params=params)
     r.raise_for_status()
-    return r.json().get("results", []) 
\ No newline at end of file
+    results = r.json().get("results", [])
+    catalog.observe("game", results)
+    return results
@@ -0,0 +1,453 @@
+import logging
+import asyncio
+from contextlib import aclosing
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional
+import httpx
+from .tmdb_client import build_prompt_from_liked_media, build_prompt_for_rerank, search_media, get_media_infos, get_cached_media_infos
+from .openrouter_client import query_openrouter, parse_llm_titles, stream_llm_titles
+from .rawg_client import get_suggested_games
+from .openlibrary_client import get_book_info, search_books
+from .similarity import similarity_engine
+from .collaborative import collaborative_filter
+from .exclusion import ExclusionIndex
+from .trending import trending_store
+from .deadline import remaining
+from .resilience import DeadlineExceeded
+from .cache import normalize_title
+from ..schemas.media import MediaRecommendation, MediaType
+from ..config import (
+    SIMILARITY_ENABLED, SIMILARITY_LLM_RERANK, COLLABORATIVE_ENABLED,
+    RECOMMENDATION_LIMIT, RECOMMENDATION_OVERFETCH, RECOMMENDATION_RETRY_DELAY,
+)
+from ..db import mongo
+
+logger = logging.getLogger(__name__)
+
+
+def get_liked_ids(record: dict) -> dict:
+    """
+    Retourne les ids likés par type de média (gère l'ancien format liste = films).
+    """
+    liked_ids = record.get("liked_ids", {}) if record else {}
+    if isinstance(liked_ids, list):
+        liked_ids = {"movie": liked_ids}
+    return liked_ids
+
+
+def get_disliked_ids(record: dict) -> dict:
+    """
+    Retourne les ids dislikés par type de média (gère l'ancien format liste = films).
+    """
+    disliked_ids = record.get("disliked_ids", {}) if record else {}
+    if isinstance(disliked_ids, list):
+        disliked_ids = {"movie": disliked_ids}
+    return disliked_ids
+
+
+async def collect_book_authors_subjects(olids: list[str]) -> tuple[set, set]:
+    """
+    Récupère en parallèle les auteurs et sujets des livres likés.
+    """
+    authors = set()
+    subjects = set()
+    books = await asyncio.gather(*(get_book_info(olid) for olid in olids), return_exceptions=True)
+    for olid, book in zip(olids, books):
+        if isinstance(book, Exception):
+            logger.warning("Informations du livre indisponibles", extra={"olid": olid, "error": repr(book)})
+            continue
+        for a in book.get("authors", []):
+            if "name" in a:
+                authors.add(a["name"])
+        for s in book.get("subjects", []):
+            subjects.add(s)
+    return authors, subjects
+
+
+async def build_exclusion_index(media_type: str, ids: list[str], disliked_ids: list[str]) -> ExclusionIndex:
+    """
+    Index d'exclusion (ids + titres normalisés des médias likés et dislikés) d'une requête.
+    Les titres ne viennent que du cache de métadonnées : un média absent du cache n'est
+    exclu que par son id (aucun appel amont).
+    """
+    infos = await get_cached_media_infos(media_type, list(ids) + list(disliked_ids))
+    titles = []
+    for data in infos.values():
+        try:
+            titles.append(MediaRecommendation.from_media(data, MediaType(media_type)).title)
+        except Exception:
+            continue
+    return ExclusionIndex(list(ids) + list(disliked_ids), titles)
+
+
+async def compute_recommendations(
+    media_type: str, ids: list[str], disliked_ids: list[str] = ()
+) -> tuple[list[MediaRecommendation], bool]:
+    """
+    Calcule les recommandations d'un type de média à partir des ids likés.
+    - Premier étage : moteur de similarité local (aucun appel externe hors métadonnées en cache)
+    - Sinon : suggestions amont (RAWG, Open Library) et LLM
+    - Amont indisponible : tendances en mémoire (films, séries, jeux)
+    Les médias déjà likés ou dislikés sont écartés avant toute hydratation.
+    Retourne (recommandations, dégradé) : un résultat dégradé (repli sur les tendances)
+    ne doit pas être matérialisé.
+    Lève KeyError/IndexError/ValueError si la réponse du LLM n'est pas exploitable (films/séries).
+    """
+    if SIMILARITY_ENABLED or COLLABORATIVE_ENABLED:
+        # Métadonnées des likés chargées avant l'index d'exclusion, qui les lit dans le cache
+        liked_infos = await get_media_infos(media_type, ids)
+        exclusion = await build_exclusion_index(media_type, ids, disliked_ids)
+        local = await _local_recommendations(media_type, ids, liked_infos, exclusion)
+        if local:
+            return local, False
+    else:
+        exclusion = await build_exclusion_index(media_type, ids, disliked_ids)
+    try:
+        recommendations = await _upstream_recommendations(media_type, ids, exclusion)
+    except httpx.HTTPError as e:
+        # Fournisseur en panne (ou disjoncteur ouvert) : tendances en mémoire plutôt qu'une erreur
+        fallback = await _trending_recommendations(media_type, exclusion)
+        if not fallback:
+            raise
+        logger.warning("Amont indisponible, repli sur les tendances", extra={"media_type": media_type, "error": repr(e)})
+        return fallback, True
+    similarity_engine.observe_recommendations(recommendations)
+    return recommendations, False
+
+
+async def _trending_recommendations(media_type: str, exclusion: ExclusionIndex) -> list[MediaRecommendation]:
+    if media_type not in trending_store.sources:
+        return []
+    return [
+        MediaRecommendation.from_media(data, MediaType(media_type))
+        for data in await trending_store.get(media_type)
+        if not exclusion.excludes_id(data.get("id"))
+    ][:RECOMMENDATION_LIMIT]
+
+
+async def _local_recommendations(
+    media_type: str, ids: list[str], liked_infos: dict[str, dict], exclusion: ExclusionIndex
+) -> list[MediaRecommendation]:
+    """
+    Candidats locaux : filtrage collaboratif (co-likes des autres utilisateurs) puis
+    moteur de similarité par contenu, éventuellement re-classés par le LLM.
+    Les candidats exclus (par id ou par titre) sont écartés, d'où un léger sur-échantillonnage.
+    Retourne une liste vide s'il n'y a pas assez de candidats.
+    """
+    similarity_engine.observe(media_type, liked_infos.values())
+    k = RECOMMENDATION_LIMIT + RECOMMENDATION_OVERFETCH
+    exclude_ids = {str(media_id) for media_id in ids}
+    candidates = await _collaborative_candidates(media_type, ids, k, exclude_ids)
+    seen_ids = {c.id for c in candidates}
+    for candidate in await similarity_engine.similar(
+        media_type, liked_infos.values(), k=k, exclude_ids=exclude_ids | seen_ids
+    ):
+        candidates.append(candidate)
+    candidates = [
+        c for c in candidates
+        if not exclusion.excludes_id(c.id) and not exclusion.excludes_title(c.title)
+    ][:RECOMMENDATION_LIMIT]
+    if len(candidates) < RECOMMENDATION_LIMIT:
+        return []
+    if SIMILARITY_LLM_RERANK:
+        try:
+            return await _rerank_with_llm(media_type, liked_infos.values(), candidates)
+        except Exception as e:
+            logger.warning("Re-classement LLM impossible, ordre local conservé", extra={"media_type": media_type, "error": repr(e)})
+    return candidates
+
+
+async def _collaborative_candidates(media_type: str, ids: list[str], k: int, exclude_ids: set[str]) -> list[MediaRecommendation]:
+    """
+    "Ceux qui ont aimé X ont aussi aimé" ; hydratés depuis l'index local, sinon le cache de métadonnées.
+    """
+    if not COLLABORATIVE_ENABLED:
+        return []
+    candidate_ids = collaborative_filter.similar_items(media_type, ids, k, exclude_ids)
+    known = {media_id: similarity_engine.get(media_type, media_id) for media_id in candidate_ids}
+    missing = [media_id for media_id, rec in known.items() if rec is None]
+    if missing:
+        infos = await get_media_infos(media_type, missing)
+        similarity_engine.observe(media_type, infos.values())
+        for media_id, data in infos.items():
+            known[media_id] = MediaRecommendation.from_media(data, MediaType(media_type))
+    return [known[media_id] for media_id in candidate_ids if known.get(media_id) is not None]
+
+
+async def _rerank_with_llm(media_type: str, liked_infos, candidates: list[MediaRecommendation]) -> list[MediaRecommendation]:
+    liked_titles = [
+        MediaRecommendation.from_media(data, MediaType(media_type)).title for data in liked_infos
+    ]
+    prompt = build_prompt_for_rerank(media_type, liked_titles, [c.title for c in candidates])
+    ranked_titles = parse_llm_titles(await query_openrouter(prompt))
+    by_title = {normalize_title(c.title): c for c in candidates}
+    reranked = []
+    for title in ranked_titles:
+        candidate = by_title.pop(normalize_title(str(title)), None)
+        if candidate is not None:
+            reranked.append(candidate)
+    # Les candidats oubliés par le LLM gardent leur ordre local, en fin de liste
+    return reranked + [c for c in candidates if normalize_title(c.title) in by_title]
+
+
+async def resolve_llm_titles(
+    media_type: str,
+    media_titles: list,
+    exclusion: ExclusionIndex,
+    seen_ids: set,
+    limit: int,
+) -> list[MediaRecommendation]:
+    """
+    Résout les titres proposés par le LLM jusqu'à obtenir `limit` recommandations valides ;
+    les titres et ids exclus sont écartés avant et après l'appel à search_media.
+    """
+    recommendations = []
+    for title in media_titles:
+        if len(recommendations) >= limit:
+            break
+        if not isinstance(title, str) or exclusion.excludes_title(title):
+            continue
+        media_details = await search_media(media_type, title)
+        if not media_details:
+            continue
+        media_id = media_details.get("olid") if media_type == "book" else media_details.get("id")
+        if not media_id or media_id in seen_ids or exclusion.excludes_id(media_id):
+            continue
+        seen_ids.add(media_id)
+        recommendations.append(MediaRecommendation.from_media(media_details, MediaType(media_type)))
+    return recommendations
+
+
+async def iter_resolved_titles(
+    media_type: str,
+    titles: AsyncIterator[str],
+    exclusion: ExclusionIndex,
+    seen_ids: set,
+) -> AsyncIterator[MediaRecommendation]:
+    """
+    Lance search_media pour chaque titre dès qu'il arrive (génération du LLM et résolutions
+    se recouvrent) et produit les recommandations valides dans leur ordre de résolution.
+    Les erreurs du flux de titres sont propagées ; celles d'une résolution isolée sont ignorées.
+    """
+    resolved: asyncio.Queue = asyncio.Queue()
+    pending: set[asyncio.Task] = set()
+
+    async def produce():
+        try:
+            async for title in titles:
+                if exclusion.excludes_title(title):
+                    continue
+                task = asyncio.create_task(search_media(media_type, title))
+                pending.add(task)
+                task.add_done_callback(resolved.put_nowait)
+        finally:
+            resolved.put_nowait(None)
+
+    producer = asyncio.create_task(produce())
+    producing = True
+    try:
+        while producing or pending:
+            task = await resolved.get()
+            if task is None:
+                producing = False
+                await producer
+                continue
+            pending.discard(task)
+            try:
+                media_details = task.result()
+            except Exception as e:
+                logger.debug("Résolution d'un titre impossible", extra={"media_type": media_type, "error": repr(e)})
+                continue
+            if not media_details:
+                continue
+            media_id = media_details.get("olid") if media_type == "book" else media_details.get("id")
+            if not media_id or media_id in seen_ids or exclusion.excludes_id(media_id):
+                continue
+            seen_ids.add(media_id)
+            yield MediaRecommendation.from_media(media_details, MediaType(media_type))
+    finally:
+        producer.cancel()
+        for task in pending:
+            task.cancel()
+
+
+async def resolve_streamed_titles(
+    media_type: str,
+    prompt: str,
+    exclusion: ExclusionIndex,
+    seen_ids: set,
+    limit: int,
+) -> list[MediaRecommendation]:
+    """
+    Équivalent streamé de query_openrouter + parse_llm_titles + resolve_llm_titles :
+    s'arrête (et annule la génération) dès que `limit` recommandations sont résolues,
+    ou à l'échéance de la requête avec les recommandations déjà résolues (résultat partiel).
+    """
+    recommendations = []
+    if limit <= 0:
+        return recommendations
+    async with aclosing(iter_resolved_titles(media_type, stream_llm_titles(prompt), exclusion, seen_ids)) as stream:
+        while len(recommendations) < limit:
+            left = remaining()
+            try:
+                recommendations.append(await asyncio.wait_for(anext(stream), left))
+            except StopAsyncIteration:
+                break
+            except asyncio.TimeoutError:
+                if not recommendations:
+                    raise DeadlineExceeded("openrouter")
+                logger.info(
+                    "Échéance atteinte, recommandations partielles",
+                    extra={"media_type": media_type, "count": len(recommendations), "limit": limit},
+                )
+                break
+    return recommendations
+
+
+async def _upstream_recommendations(media_type: str, ids: list[str], exclusion: ExclusionIndex) -> list[MediaRecommendation]:
+    # Le LLM propose plus de titres que nécessaire pour compenser ceux écartés
+    llm_count = RECOMMENDATION_LIMIT + RECOMMENDATION_OVERFETCH
+    # --- LOGIQUE SPECIALE POUR LES JEUX ---
+    if media_type == "game":
+        suggestions = []
+        seen_ids = set()
+        for game_id in ids:
+            try:
+                for game in await get_suggested_games(game_id, page_size=10):
+                    if game["id"] not in seen_ids and not exclusion.excludes_id(game["id"]):
+                        suggestions.append(MediaRecommendation.from_game(game))
+                        seen_ids.add(game["id"])
+            except Exception as e:
+                logger.warning("Suggestions RAWG indisponibles", extra={"game_id": game_id, "error": repr(e)})
+        # Suggestions LLM (complément)
+        if len(suggestions) < RECOMMENDATION_LIMIT:
+            prompt = await build_prompt_from_liked_media(media_type, ids, count=llm_count)
+            try:
+                suggestions += await resolve_streamed_titles(
+                    media_type, prompt, exclusion, seen_ids, RECOMMENDATION_LIMIT - len(suggestions),
+                )
+            except Exception as e:
+                logger.warning("Suggestions LLM indisponibles", extra={"media_type": media_type, "error": repr(e)})
+        return suggestions[:RECOMMENDATION_LIMIT]
+    # --- LOGIQUE SPECIALE POUR LES LIVRES ---
+    if media_type == "book":
+        suggestions = []
+        seen_olids = set()
+        authors, subjects = await collect_book_authors_subjects(ids)
+        # Suggestions par auteur puis par genre
+        for query in list(authors)[:2] + list(subjects)[:2]:
+            try:
+                for doc in (await search_books(query, limit=5))[:5]:
+                    olid = doc.get("olid")
+                    if olid and olid not in seen_olids and not exclusion.excludes_id(olid):
+                        suggestions.append(MediaRecommendation.from_book(doc))
+                        seen_olids.add(olid)
+            except Exception as e:
+                logger.warning("Suggestions Open Library indisponibles", extra={"query": query, "error": repr(e)})
+        # Suggestions LLM (complément)
+        if len(suggestions) < RECOMMENDATION_LIMIT:
+            prompt = await build_prompt_from_liked_media(media_type, ids, count=llm_count)
+            try:
+                suggestions += await resolve_streamed_titles(
+                    media_type, prompt, exclusion, seen_olids, RECOMMENDATION_LIMIT - len(suggestions),
+                )
+            except Exception as e:
+                logger.warning("Suggestions LLM indisponibles", extra={"media_type": media_type, "error": repr(e)})
+        return suggestions[:RECOMMENDATION_LIMIT]
+    # --- LOGIQUE GENERIQUE POUR AUTRES MEDIAS ---
+    prompt = await build_prompt_from_liked_media(media_type, ids, count=llm_count)
+    return await resolve_streamed_titles(media_type, prompt, exclusion, set(), RECOMMENDATION_LIMIT)
+
+
+async def get_materialized(user_id: str, media_type: str) -> Optional[dict]:
+    """
+    Recommandations matérialisées d'un utilisateur (une lecture sur l'index (user_id, media_type)).
+    """
+    return await mongo.user_recommendations_collection.find_one({"user_id": user_id, "media_type": media_type})
+
+
+async def store_materialized(user_id: str, media_type: str, recommendations: list[MediaRecommendation]) -> datetime:
+    updated_at = datetime.now(timezone.utc)
+    await mongo.user_recommendations_collection.update_one(
+        {"user_id": user_id, "media_type": media_type},
+        {"$set": {
+            "items": [r.model_dump(mode="json") for r in recommendations],
+            "updated_at": updated_at,
+        }},
+        upsert=True,
+    )
+    return updated_at
+
+
+class RecommendationMaterializer:
+    """
+    Recalcule en tâche de fond les recommandations matérialisées d'un utilisateur
+    quand ses interactions changent (like, dislike, unlike, undislike).
+    Les demandes identiques en attente sont fusionnées.
+    """
+
+    def __init__(self):
+        self._queue: asyncio.Queue[tuple[str, str]] = asyncio.Queue()
+        self._pending: set[tuple[str, str]] = set()
+        self._retrying: set[tuple[str, str]] = set()
+
+    def schedule(self, user_id: str, media_type: str) -> None:
+        key = (user_id, media_type)
+        if key in self._pending:
+            return
+        self._pending.add(key)
+        self._queue.put_nowait(key)
+
+    def schedule_retry(self, user_id: str, media_type: str, delay: float = RECOMMENDATION_RETRY_DELAY) -> None:
+        """
+        Reprogramme un recalcul après `delay` secondes (amont indisponible lors du calcul).
+        Un seul essai programmé à la fois par (utilisateur, type).
+        """
+        key = (user_id, media_type)
+        if key in self._retrying:
+            return
+        self._retrying.add(key)
+
+        def retry():
+            self._retrying.discard(key)
+            self.schedule(user_id, media_type)
+
+        asyncio.get_running_loop().call_later(delay, retry)
+
+    def is_pending(self, user_id: str, media_type: str) -> bool:
+        return (user_id, media_type) in self._pending
+
+    async def recompute(self, user_id: str, media_type: str) -> None:
+        record = await mongo.interactions_collection.find_one({"user_id": user_id})
+        ids = get_liked_ids(record).get(media_type, [])
+        if not ids:
+            await mongo.user_recommendations_collection.delete_one({"user_id": user_id, "media_type": media_type})
+            return
+        disliked_ids = get_disliked_ids(record).get(media_type, [])
+        recommendations, degraded = await compute_recommendations(media_type, ids, disliked_ids)
+        if degraded:
+            # Les recommandations matérialisées précédentes restent servies jusqu'au prochain essai
+            self.schedule_retry(user_id, media_type)
+            return
+        await store_materialized(user_id, media_type, recommendations)
+
+    async def run(self) -> None:
+        """
+        Boucle du worker, lancée dans le lifespan de l'application.
+        """
+        while True:
+            user_id, media_type = await self._queue.get()
+            # Retiré avant le calcul : un like arrivant pendant le calcul reprogramme un recalcul
+            self._pending.discard((user_id, media_type))
+            try:
+                await self.recompute(user_id, media_type)
+            except Exception as e:
+                logger.warning(
+                    "Recalcul des recommandations impossible",
+                    extra={"user_id": user_id, "media_type": media_type, "error": repr(e)},
+                )
+            finally:
+                self._queue.task_done()
+
+
+materializer = RecommendationMaterializer()
@@ -0,0 +1,367 @@
+import asyncio
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+import httpx
+from .deadline import remaining, budget
+from .metrics import UPSTREAM_LATENCY, UPSTREAM_ERRORS, UPSTREAM_RATE_LIMITED, UPSTREAM_HEDGED
+from ..config import (
+    RATE_LIMIT_MAX_WAIT, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RECOVERY_TIME, RETRY_AFTER_MAX_WAIT,
+    HEDGING_ENABLED, HEDGE_MIN_SAMPLES,
+)
+
+
+class ProviderUnavailable(httpx.TransportError):
+    """
+    Appel refusé sans contacter le fournisseur (disjoncteur ouvert, quota épuisé, Retry-After en cours).
+    Hérite de httpx.TransportError : les gestionnaires d'erreurs amont existants la traitent comme une panne réseau.
+    """
+
+    def __init__(self, provider: str, reason: str, retry_in: float = 0.0):
+        super().__init__(f"{provider} indisponible ({reason}), nouvel essai dans {retry_in:.1f}s")
+        self.provider = provider
+        self.retry_in = retry_in
+
+
+class DeadlineExceeded(httpx.TimeoutException):
+    """
+    Échéance de la requête entrante atteinte avant l'appel amont.
+    """
+
+    def __init__(self, provider: str):
+        super().__init__(f"Échéance de la requête atteinte avant l'appel à {provider}")
+        self.provider = provider
+
+
+class LatencyTracker:
+    """
+    Latences récentes d'un fournisseur (fenêtre glissante) et leur 95e centile,
+    recalculé au plus toutes les `min_samples` observations.
+    """
+
+    def __init__(self, window: int = 200, min_samples: int = HEDGE_MIN_SAMPLES):
+        self.min_samples = min_samples
+        self._samples: deque[float] = deque(maxlen=window)
+        self._p95: Optional[float] = None
+        self._since_update = 0
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+        self._since_update += 1
+
+    def p95(self) -> Optional[float]:
+        if len(self._samples) < self.min_samples:
+            return None
+        if self._p95 is None or self._since_update >= self.min_samples:
+            ordered = sorted(self._samples)
+            self._p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+            self._since_update = 0
+        return self._p95
+
+
+class TokenBucket:
+    """
+    Limiteur à jetons : `rate` appels par seconde en régime établi, rafales jusqu'à `burst`.
+    Les appelants attendent leur jeton dans l'ordre d'arrivée ; au-delà de `max_wait`,
+    l'appel est refusé plutôt que mis en file (back-pressure).
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def available(self) -> float:
+        """
+        Jetons disponibles immédiatement (fractionnaires).
+        """
+        self._refill()
+        return self._tokens
+
+    def reserve(self, max_wait: float) -> Optional[float]:
+        """
+        Réserve un jeton ; retourne l'attente nécessaire, ou None si elle dépasse `max_wait`.
+        """
+        self._refill()
+        wait = max(0.0, (1 - self._tokens) / self.rate)
+        if wait > max_wait:
+            return None
+        self._tokens -= 1
+        return wait
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur d'un fournisseur :
+    - fermé : les appels passent, les échecs consécutifs sont comptés
+    - ouvert (après `failure_threshold` échecs ou un Retry-After) : échec immédiat jusqu'à `recovery_time`
+    - semi-ouvert : un seul appel de test ; son succès referme le disjoncteur, son échec le rouvre
+    """
+
+    def __init__(self, failure_threshold: int, recovery_time: float):
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.failures = 0
+        self.opened_until = 0.0
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_until == 0.0:
+            return "closed"
+        return "open" if time.monotonic() < self.opened_until or self._probing else "half_open"
+
+    def retry_in(self) -> float:
+        return max(0.0, self.opened_until - time.monotonic())
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open":
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_until = 0.0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            self.open(self.recovery_time)
+
+    def release_probe(self) -> None:
+        self._probing = False
+
+    def open(self, duration: float) -> None:
+        self._probing = False
+        self.opened_until = max(self.opened_until, time.monotonic() + duration)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Délai (secondes) d'un en-tête Retry-After, exprimé en secondes ou en date HTTP.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class ResilientTransport(httpx.AsyncBaseTransport):
+    """
+    Transport httpx d'un fournisseur : limiteur à jetons, disjoncteur et respect de Retry-After
+    autour du transport réseau. Les erreurs réseau et réponses 5xx/429 comptent comme des échecs.
+    Un 429/503 avec un Retry-After court est rejoué une fois ; sinon le fournisseur est
+    suspendu pour la durée indiquée et la réponse est retournée à l'appelant.
+    - Les timeouts sont bornés par le temps restant de la requête entrante (deadline.py)
+    - Un GET plus lent que le p95 du fournisseur est doublé (hedging) ; la première réponse gagne
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        transport: httpx.AsyncBaseTransport,
+        bucket: TokenBucket,
+        breaker: CircuitBreaker,
+        latency: LatencyTracker,
+    ):
+        self.provider = provider
+        self.transport = transport
+        self.bucket = bucket
+        self.breaker = breaker
+        self.latency = latency
+
+    def _apply_deadline(self, request: httpx.Request) -> bool:
+        """
+        Borne les timeouts de l'appel par le temps restant ; retourne True s'ils ont été raccourcis.
+        """
+        left = remaining()
+        if left is None:
+            return False
+        if left <= 0:
+            UPSTREAM_ERRORS.labels(self.provider, "deadline").inc()
+            raise DeadlineExceeded(self.provider)
+        timeouts = dict(request.extensions.get("timeout", {}))
+        clamped = False
+        for key, value in timeouts.items():
+            if value is None or value > left:
+                timeouts[key] = left
+                clamped = True
+        request.extensions["timeout"] = timeouts
+        return clamped
+
+    async def _acquire(self, retry: bool = False) -> bool:
+        """
+        Passe le disjoncteur (sauf pour le rejeu d'un même appel) puis réserve un jeton ;
+        retourne True si l'appel est le test du disjoncteur semi-ouvert.
+        """
+        probe = False
+        if not retry:
+            probe = self.breaker.state == "half_open"
+            if not self.breaker.allow():
+                UPSTREAM_ERRORS.labels(self.provider, "circuit_open").inc()
+                raise ProviderUnavailable(self.provider, "disjoncteur ouvert", self.breaker.retry_in())
+        wait = self.bucket.reserve(budget(RATE_LIMIT_MAX_WAIT))
+        if wait is None:
+            if probe:
+                self.breaker.release_probe()
+            UPSTREAM_ERRORS.labels(self.provider, "local_rate_limit").inc()
+            raise ProviderUnavailable(self.provider, "quota local épuisé", 1 / self.bucket.rate)
+        if wait:
+            await asyncio.sleep(wait)
+        return probe
+
+    async def _send(self, request: httpx.Request) -> httpx.Response:
+        started = time.monotonic()
+        hedge_after = self.latency.p95() if HEDGING_ENABLED and request.method == "GET" else None
+        if hedge_after is None:
+            response = await self.transport.handle_async_request(request)
+        else:
+            response = await self._send_hedged(request, hedge_after)
+        elapsed = time.monotonic() - started
+        self.latency.observe(elapsed)
+        UPSTREAM_LATENCY.labels(self.provider, f"{response.status_code // 100}xx").observe(elapsed)
+        return response
+
+    async def _send_hedged(self, request: httpx.Request, hedge_after: float) -> httpx.Response:
+        primary = asyncio.ensure_future(self.transport.handle_async_request(request))
+        try:
+            return await asyncio.wait_for(asyncio.shield(primary), hedge_after)
+        except asyncio.TimeoutError:
+            pass
+        except BaseException:
+            primary.cancel()
+            raise
+        left = remaining()
+        # Pas de doublon si l'échéance est trop proche ou si le quota ne le permet pas
+        if (left is not None and left <= hedge_after) or self.bucket.reserve(0) is None:
+            return await primary
+        UPSTREAM_HEDGED.labels(self.provider).inc()
+        pending = {primary, asyncio.ensure_future(self.transport.handle_async_request(request))}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = task.result()
+                        for other in done - {task}:
+                            _discard(other)
+                        return winner
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+                task.add_done_callback(_discard)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        # Appel de test du disjoncteur semi-ouvert : libéré s'il se termine sans verdict
+        # (échéance atteinte avant le rejeu, timeout raccourci, annulation)
+        probe = settled = False
+        try:
+            for attempt in range(2):
+                clamped = self._apply_deadline(request)
+                if attempt == 0:
+                    probe = await self._acquire()
+                else:
+                    await self._acquire(retry=True)
+                try:
+                    response = await self._send(request)
+                except httpx.TimeoutException:
+                    UPSTREAM_ERRORS.labels(self.provider, "timeout").inc()
+                    # Timeout raccourci par l'échéance de la requête : pas une défaillance du fournisseur
+                    if not clamped:
+                        self.breaker.record_failure()
+                        settled = True
+                    raise
+                except httpx.TransportError:
+                    UPSTREAM_ERRORS.labels(self.provider, "transport").inc()
+                    self.breaker.record_failure()
+                    settled = True
+                    raise
+                if response.status_code not in (429, 503) and response.status_code < 500:
+                    self.breaker.record_success()
+                    settled = True
+                    return response
+                if response.status_code == 429:
+                    UPSTREAM_RATE_LIMITED.labels(self.provider).inc()
+                else:
+                    UPSTREAM_ERRORS.labels(self.provider, f"http_{response.status_code}").inc()
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                if retry_after is None or (retry_after <= 0 and attempt > 0):
+                    # Retry-After nul : nouvel essai permis tout de suite, pas de suspension du fournisseur
+                    self.breaker.record_failure()
+                    settled = True
+                    return response
+                if attempt == 0 and retry_after <= max(0.0, budget(RETRY_AFTER_MAX_WAIT)):
+                    await response.aclose()
+                    await asyncio.sleep(retry_after)
+                    continue
+                # Fournisseur saturé : les appels suivants échouent immédiatement jusqu'à l'échéance
+                self.breaker.open(retry_after)
+                settled = True
+                return response
+        finally:
+            if probe and not settled:
+                self.breaker.release_probe()
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+def _discard(task: asyncio.Future) -> None:
+    """
+    Libère la réponse d'un appel perdant (hedging) et consomme son éventuelle exception.
+    """
+    if not task.done() or task.cancelled():
+        return
+    if task.exception() is None:
+        asyncio.ensure_future(task.result().aclose())
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_buckets: dict[str, TokenBucket] = {}
+_latencies: dict[str, LatencyTracker] = {}
+
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    if provider not in _breakers:
+        _breakers[provider] = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RECOVERY_TIME)
+    return _breakers[provider]
+
+
+def get_bucket(provider: str, rate: float, burst: int) -> TokenBucket:
+    if provider not in _buckets:
+        _buckets[provider] = TokenBucket(rate, burst)
+    return _buckets[provider]
+
+
+def get_latency(provider: str) -> LatencyTracker:
+    if provider not in _latencies:
+        _latencies[provider] = LatencyTracker()
+    return _latencies[provider]
+
+
+def provider_available(provider: str) -> bool:
+    """
+    Faux si le disjoncteur du fournisseur est ouvert (les appels échoueraient immédiatement).
+    """
+    return get_breaker(provider).state != "open"
@@ -0,0 +1,184 @@
+import gzip
+import hashlib
+from dataclasses import dataclass, field
+from typing import Any, Callable, Hashable, Optional
+import orjson
+from pydantic import BaseModel
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+
+try:
+    import brotli
+except ImportError:  # brotli optionnel : gzip seul
+    brotli = None
+
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+# Types de contenu streamés, jamais compressés (la compression bufferiserait les événements)
+_STREAM_CONTENT_TYPES = ("text/event-stream", "application/x-ndjson")
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    raise TypeError(f"Type non sérialisable : {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Sérialisation JSON rapide (orjson) ; accepte directement les modèles Pydantic.
+    """
+    return orjson.dumps(content, default=_default, option=_ORJSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Réponse JSON sérialisée par orjson (classe de réponse par défaut de l'application).
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+def supported_encodings() -> tuple[str, ...]:
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate_encoding(accept_encoding: str, available: tuple[str, ...]) -> Optional[str]:
+    """
+    Choisit l'encodage de l'en-tête Accept-Encoding (q-values respectées), brotli de préférence.
+    """
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+    wildcard = accepted.get("*", 0.0)
+    candidates = [(accepted.get(encoding, wildcard), encoding) for encoding in available]
+    candidates = [(quality, encoding) for quality, encoding in candidates if quality > 0]
+    if not candidates:
+        return None
+    # À qualité égale, l'ordre de `available` (br puis gzip) départage
+    return max(candidates, key=lambda c: (c[0], -available.index(c[1])))[1]
+
+
+@dataclass(frozen=True)
+class EncodedPayload:
+    """
+    Corps JSON sérialisé une fois, avec son ETag et ses variantes compressées.
+    """
+    body: bytes
+    etag: str
+    encoded: dict[str, bytes] = field(default_factory=dict)
+
+    @classmethod
+    def build(cls, content: Any) -> "EncodedPayload":
+        body = dumps(content)
+        etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        return cls(body, etag, {encoding: _compress(body, encoding) for encoding in supported_encodings()})
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+def encoded_response(request: Request, payload: EncodedPayload, cache_control: Optional[str] = None) -> Response:
+    """
+    Réponse à partir d'un corps pré-sérialisé : 304 si l'ETag du client est à jour,
+    sinon la variante compressée négociée (ou le JSON brut).
+    """
+    headers = {"ETag": payload.etag, "Vary": "Accept-Encoding"}
+    if cache_control:
+        headers["Cache-Control"] = cache_control
+    if _etag_matches(request.headers.get("if-none-match"), payload.etag):
+        return Response(status_code=304, headers=headers)
+    encoding = negotiate_encoding(request.headers.get("accept-encoding", ""), tuple(payload.encoded))
+    body = payload.body
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+        body = payload.encoded[encoding]
+    return Response(body, media_type="application/json", headers=headers)
+
+
+class PayloadCache:
+    """
+    Corps pré-sérialisés indexés par clé et version (ex. date de rafraîchissement des tendances) :
+    reconstruits uniquement quand la version change.
+    """
+
+    def __init__(self):
+        self._data: dict[Hashable, tuple[Any, EncodedPayload]] = {}
+
+    def get(self, key: Hashable, version: Any, build: Callable[[], Any]) -> EncodedPayload:
+        entry = self._data.get(key)
+        if entry is None or entry[0] != version:
+            entry = (version, EncodedPayload.build(build()))
+            self._data[key] = entry
+        return entry[1]
+
+
+class CompressionMiddleware:
+    """
+    Middleware ASGI de compression négociée (brotli ou gzip) des réponses dynamiques.
+    Ignore les petites réponses, les réponses streamées ou déjà encodées (corps pré-compressés).
+    """
+
+    def __init__(self, app, minimum_size: int = 1000):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""), supported_encodings())
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        start_message = None
+
+        async def send_compressed(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                # Attente du premier fragment du corps pour décider de la compression
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+            start, start_message = start_message, None
+            headers = MutableHeaders(raw=start["headers"])
+            body = message.get("body", b"")
+            if (
+                message.get("more_body", False)
+                or "content-encoding" in headers
+                or headers.get("content-type", "").startswith(_STREAM_CONTENT_TYPES)
+                or len(body) < self.minimum_size
+            ):
+                await send(start)
+                await send(message)
+                return
+            body = _compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,221 @@
+import re
+import zlib
+import asyncio
+from collections import OrderedDict
+import numpy as np
+from typing import Iterable, Optional
+from ..schemas.media import MediaRecommendation, MediaType
+from ..config import SIMILARITY_DIM, SIMILARITY_INDEX_SIZE, SIMILARITY_MIN_SCORE
+
+_WORD_RE = re.compile(r"[^\W\d_]{4,}")
+_STOPWORDS = {
+    "avec", "dans", "pour", "mais", "sont", "elle", "leur", "leurs", "cette", "tout", "tous",
+    "plus", "comme", "être", "fait", "faire", "entre", "après", "avant", "sans", "sous", "vers",
+    "with", "that", "this", "from", "their", "they", "have", "when", "into", "after", "about",
+}
+# Poids relatifs des familles de caractéristiques
+_WEIGHTS = {"genre": 3.0, "platform": 1.0, "author": 2.0, "decade": 1.0, "word": 0.5}
+
+
+def _features(rec: MediaRecommendation, raw: dict) -> Iterable[tuple[str, float]]:
+    """
+    Caractéristiques d'un média : genres (ids TMDB quand disponibles, sinon noms / sujets),
+    plateformes, auteur, décennie de sortie et mots de la description.
+    """
+    genre_ids = raw.get("genre_ids") or [g["id"] for g in raw.get("genres", []) if isinstance(g, dict) and "id" in g]
+    if rec.media_type in (MediaType.MOVIE, MediaType.TV) and genre_ids:
+        for genre_id in genre_ids:
+            yield f"genre:{genre_id}", _WEIGHTS["genre"]
+    else:
+        for genre in rec.genres:
+            yield f"genre:{str(genre).lower()}", _WEIGHTS["genre"]
+    for platform in rec.platforms:
+        yield f"platform:{platform.lower()}", _WEIGHTS["platform"]
+    if rec.author:
+        yield f"author:{rec.author.lower()}", _WEIGHTS["author"]
+    if rec.release_date and rec.release_date[:4].isdigit():
+        yield f"decade:{rec.release_date[:3]}", _WEIGHTS["decade"]
+    if rec.overview:
+        for word in set(_WORD_RE.findall(rec.overview.lower())) - _STOPWORDS:
+            yield f"word:{word}", _WEIGHTS["word"]
+
+
+def vectorize(rec: MediaRecommendation, raw: dict, dim: int = SIMILARITY_DIM) -> np.ndarray:
+    """
+    Vecteur normalisé (hashing trick, crc32 stable entre processus).
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature, weight in _features(rec, raw):
+        vector[zlib.crc32(feature.encode("utf-8")) % dim] += weight
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector
+
+
+class SimilarityIndex:
+    """
+    Index vectoriel en mémoire d'un type de média : matrice NumPy (capacité x dim) des médias connus,
+    remplie ligne à ligne (capacité doublée au besoin, lignes des médias évincés réutilisées),
+    interrogée par similarité cosinus (top-k) à partir d'un ensemble de médias likés.
+    Les médias les plus anciens sont évincés au-delà de `max_items`.
+    Copie sur écriture : une écriture pendant un calcul en cours dans un thread porte sur une
+    copie de la matrice, le calcul garde l'ancienne (jamais de ligne à moitié écrite).
+    """
+
+    def __init__(self, dim: int, max_items: int):
+        self.dim = dim
+        self.max_items = max_items
+        self._items: OrderedDict[str, MediaRecommendation] = OrderedDict()
+        self._positions: dict[str, int] = {}
+        # Id du média de chaque ligne (None : ligne libre, vecteur nul)
+        self._ids: list[Optional[str]] = []
+        self._free: list[int] = []
+        self._matrix = np.zeros((0, dim), dtype=np.float32)
+        # Calculs en cours dans un thread sur la matrice courante
+        self._readers = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, media_id: str) -> Optional[MediaRecommendation]:
+        return self._items.get(media_id)
+
+    def add(self, rec: MediaRecommendation, vector: np.ndarray) -> None:
+        if not vector.any():
+            return
+        row = self._positions.get(rec.id)
+        if row is not None:
+            # Média déjà indexé : ligne mise à jour sur place (rien à faire s'il est inchangé)
+            self._items.move_to_end(rec.id)
+            if self._items[rec.id] != rec or not np.array_equal(self._matrix[row], vector):
+                self._items[rec.id] = rec
+                self._writable()[row] = vector
+            return
+        if len(self._items) >= self.max_items:
+            self._evict(next(iter(self._items)))
+        row = self._allocate()
+        self._items[rec.id] = rec
+        self._positions[rec.id] = row
+        self._ids[row] = rec.id
+        self._writable()[row] = vector
+
+    def _allocate(self) -> int:
+        if self._free:
+            return self._free.pop()
+        row = len(self._ids)
+        if row >= len(self._matrix):
+            capacity = min(self.max_items, max(1024, 2 * len(self._matrix)))
+            matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+            matrix[:row] = self._matrix[:row]
+            # Nouvelle matrice : un calcul en cours dans un thread garde l'ancienne
+            self._matrix = matrix
+            self._readers = 0
+        self._ids.append(None)
+        return row
+
+    def _evict(self, media_id: str) -> None:
+        del self._items[media_id]
+        row = self._positions.pop(media_id)
+        self._ids[row] = None
+        self._writable()[row] = 0
+        self._free.append(row)
+
+    def _writable(self) -> np.ndarray:
+        """
+        Matrice modifiable sur place : copiée si un calcul en cours la lit encore.
+        """
+        if self._readers:
+            self._matrix = self._matrix.copy()
+            self._readers = 0
+        return self._matrix
+
+    @staticmethod
+    def _scores(matrix: np.ndarray, queries: np.ndarray, masked: list[int]) -> np.ndarray:
+        scores = (matrix @ queries.T).mean(axis=1)
+        scores[masked] = -np.inf
+        return scores
+
+    async def similar(self, queries: np.ndarray, k: int, exclude_ids: set[str]) -> list[tuple[MediaRecommendation, float]]:
+        """
+        Top-k des médias les plus proches du profil (moyenne des similarités cosinus
+        avec chaque média liké, calculées en un seul produit matriciel, hors boucle d'événements).
+        """
+        if not self._items or not len(queries):
+            return []
+        ids = list(self._ids)
+        masked = [self._positions[i] for i in exclude_ids if i in self._positions] + list(self._free)
+        matrix = self._matrix
+        self._readers += 1
+        try:
+            scores = await asyncio.to_thread(self._scores, matrix[:len(ids)], queries, masked)
+        finally:
+            if matrix is self._matrix:
+                self._readers -= 1
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        results = []
+        for i in top:
+            media_id = ids[i]
+            # Médias évincés ou remplacés pendant le calcul ignorés
+            if scores[i] < SIMILARITY_MIN_SCORE or media_id is None or self._positions.get(media_id) != i:
+                continue
+            results.append((self._items[media_id], float(scores[i])))
+        return results
+
+
+class SimilarityEngine:
+    """
+    Moteur de recommandation par contenu, sans appel externe : un index par type de média,
+    alimenté par les métadonnées déjà récupérées (tendances, médias likés, suggestions).
+    """
+
+    def __init__(self, dim: int, max_items: int):
+        self.indexes = {media_type.value: SimilarityIndex(dim, max_items) for media_type in MediaType}
+
+    def observe(self, media_type: str, raw_items: Iterable[dict]) -> None:
+        """
+        Ajoute des médias bruts (réponses TMDB, RAWG ou Open Library) à l'index.
+        """
+        for raw in raw_items:
+            try:
+                rec = MediaRecommendation.from_media(raw, MediaType(media_type))
+            except Exception:
+                continue
+            self._add(rec, raw)
+
+    def observe_recommendations(self, recommendations: Iterable[MediaRecommendation]) -> None:
+        """
+        Ajoute des recommandations sans métadonnées brutes ; un média déjà indexé garde son
+        vecteur (plus riche quand il vient de observe : ids de genres TMDB).
+        """
+        for rec in recommendations:
+            if rec.id and self.get(rec.media_type.value, rec.id) is None:
+                self._add(rec, {})
+
+    def _add(self, rec: MediaRecommendation, raw: dict) -> None:
+        if rec.id and rec.title:
+            index = self.indexes[rec.media_type.value]
+            index.add(rec, vectorize(rec, raw, index.dim))
+
+    def get(self, media_type: str, media_id: str) -> Optional[MediaRecommendation]:
+        return self.indexes[media_type].get(str(media_id))
+
+    async def similar(self, media_type: str, liked_items: Iterable[dict], k: int, exclude_ids: set[str]) -> list[MediaRecommendation]:
+        index = self.indexes[media_type]
+        queries = []
+        for raw in liked_items:
+            try:
+                rec = MediaRecommendation.from_media(raw, MediaType(media_type))
+            except Exception:
+                continue
+            vector = vectorize(rec, raw, index.dim)
+            if vector.any():
+                queries.append(vector)
+        if not queries:
+            return []
+        return [rec for rec, _ in await index.similar(np.vstack(queries), k, exclude_ids)]
+
+
+similarity_engine = SimilarityEngine(SIMILARITY_DIM, SIMILARITY_INDEX_SIZE)
@@ -0,0 +1,45 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+from .deadline import remaining, without_deadline
+from .resilience import DeadlineExceeded
+
+
+class SingleFlight:
+    """
+    Regroupe les appels concurrents portant sur la même clé : un seul appel amont est
+    lancé, tous les appelants reçoivent son résultat (ou son exception).
+    L'appel partagé s'exécute sans l'échéance du premier appelant ; chaque appelant n'attend
+    que jusqu'à sa propre échéance (DeadlineExceeded au-delà).
+    L'appel partagé n'est jamais annulé : il va à son terme même si tous les appelants
+    sont partis (annulés ou échéance atteinte), et son résultat alimente alors les caches.
+    """
+
+    def __init__(self):
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Évite l'avertissement "exception was never retrieved" si tous les appelants sont partis
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(fn(), context=without_deadline())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), remaining())
+        except asyncio.TimeoutError:
+            if task.done():
+                raise
+            raise DeadlineExceeded(str(key[0] if isinstance(key, tuple) and key else key)) from None
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+
+# Instance partagée par les clients amont (les clés sont préfixées par fournisseur)
+upstream_flight = SingleFlight()
@@ -1,26 +1,38 @@
-import requests
-from typing import Optional
-from ..config import TMDB_API_KEY, RAWG_API_KEY
+import logging
+import asyncio
+from typing import Optional, Sequence
+from ..config import TMDB_API_KEY, METADATA_FETCH_CONCURRENCY, METADATA_FETCH_DEADLINE, CATALOG_ENABLED
+from .http_client import get_client
+from .cache import metadata_cache, title_cache, split_title_year
+from .catalog import catalog, rank_results
+from .singleflight import upstream_flight
+from .deadline import budget
 from .rawg_client import search_game, get_game_info
 from .openlibrary_client import search_book, get_book_info
 
-TMDB_BASE_URL = "https://api.themoviedb.org/3"
+logger = logging.getLogger(__name__)
 
-def get_top_media(media_type: str = "movie", time_window: str = "day") -> list[dict]:
+async def get_top_media(media_type: str = "movie", time_window: str = "day") -> list[dict]:
     """
     Récupère les médias les plus populaires (films, séries, etc.).
     """
-    url = f"{TMDB_BASE_URL}/trending/{media_type}/{time_window}"
+    return await upstream_flight.do(
+        ("tmdb", "trending", media_type, time_window),
+        lambda: _fetch_top_media(media_type, time_window),
+    )
+
+async def _fetch_top_media(media_type: str, time_window: str) -> list[dict]:
+    url = f"/trending/{media_type}/{time_window}"
     params = {
         "api_key": TMDB_API_KEY,
         "language": "fr-FR",
         "page": 1
     }
-    response = requests.get(url, params=params)
+    response = await get_client("tmdb").get(url, params=params)
     response.raise_for_status()
     return response.json().get("results", [])
 
-def get_media_info(media_type: str, media_id: str) -> dict:
+async def get_media_info(media_type: str, media_id: str) -> dict:
     """
     Récupère les informations détaillées d'un média à partir de son ID.
     - Pour 'movie' ou 'tv' : id TMDB
@@ -28,63 +40,139 @@ def get_media_info(media_type: str, media_id: str) -> dict:
     - Pour 'book' : id OpenLibrary (OLID)
     """
     if media_type == "game":
-        return get_game_info(media_id)
+        return await get_game_info(media_id)
     if media_type == "book":
-        return get_book_info(media_id)
-    url = f"{TMDB_BASE_URL}/{media_type}/{media_id}"
+        return await get_book_info(media_id)
+    return await metadata_cache.get_or_fetch_media(
+        media_type, media_id, "fr-FR", lambda: _fetch_tmdb_info(media_type, media_id)
+    )
+
+async def _fetch_tmdb_info(media_type: str, media_id: str) -> dict:
+    url = f"/{media_type}/{media_id}"
     params = {
         "api_key": TMDB_API_KEY,
         "language": "fr-FR"
     }
-    response = requests.get(url, params=params)
+    response = await get_client("tmdb").get(url, params=params)
     response.raise_for_status()
-    return response.json()
+    data = response.json()
+    catalog.observe(media_type, [data])
+    return data
 
-def search_media(media_type: str, title: str) -> Optional[dict]:
+async def search_media(media_type: str, title: str) -> Optional[dict]:
     """
     Recherche un média par son titre et retourne le premier résultat.
     - Pour 'movie' ou 'tv' : id TMDB
     - Pour 'game' : id RAWG
     - Pour 'book' : id OpenLibrary (OLID)
+    Le catalogue local (index flou, année et type de média pris en compte) est consulté
+    avant la recherche amont. Les résolutions (y compris les titres introuvables) sont
+    mises en cache par titre normalisé.
     """
+    return await title_cache.resolve(media_type, title, lambda: _resolve_title(media_type, title))
+
+async def _resolve_title(media_type: str, title: str) -> Optional[dict]:
+    if CATALOG_ENABLED:
+        local = await catalog.lookup(media_type, title)
+        if local is not None:
+            return local
+    return await _search_media_upstream(media_type, title)
+
+async def _search_media_upstream(media_type: str, title: str) -> Optional[dict]:
     if media_type == "game":
-        return search_game(title)
+        return await search_game(title)
     if media_type == "book":
-        return search_book(title)
-    url = f"{TMDB_BASE_URL}/search/{media_type}"
+        return await search_book(title)
+    url = f"/search/{media_type}"
+    query, year = split_title_year(title)
     params = {
         "api_key": TMDB_API_KEY,
-        "query": title,
+        "query": query.strip() or title,
         "language": "fr-FR"
     }
-    response = requests.get(url, params=params)
+    if year is not None:
+        params["year" if media_type == "movie" else "first_air_date_year"] = year
+    response = await get_client("tmdb").get(url, params=params)
     response.raise_for_status()
     results = response.json().get("results", [])
-    if results:
-        return results[0]
-    return None
+    catalog.observe(media_type, results)
+    return rank_results(media_type, title, results)
+
+async def get_cached_media_infos(media_type: str, media_ids: list[str]) -> dict[str, dict]:
+    """
+    Informations des médias déjà présentes dans le cache de métadonnées (mémoire ou Mongo) ;
+    les médias inconnus sont ignorés, aucun appel TMDB/RAWG/OpenLibrary n'est fait.
+    """
+    language = "fr-FR" if media_type in ("movie", "tv") else None
+    return await metadata_cache.peek_media(media_type, list(dict.fromkeys(media_ids)), language)
+
+async def get_media_infos(
+    media_type: str,
+    media_ids: list[str],
+    concurrency: int = METADATA_FETCH_CONCURRENCY,
+    deadline: float = METADATA_FETCH_DEADLINE,
+) -> dict[str, dict]:
+    """
+    Récupère en parallèle les informations de plusieurs médias.
+    - Au plus `concurrency` appels amont simultanés
+    - Retourne les résultats arrivés avant `deadline` secondes, bornées par l'échéance de la
+      requête (résultat partiel possible) ; les appels en échec ou trop lents sont ignorés
+    """
+    deadline = budget(deadline)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def fetch(media_id: str) -> dict:
+        async with semaphore:
+            return await get_media_info(media_type, media_id)
+
+    unique_ids = list(dict.fromkeys(media_ids))
+    tasks = {asyncio.create_task(fetch(media_id)): media_id for media_id in unique_ids}
+    if not tasks:
+        return {}
+    done, pending = await asyncio.wait(tasks, timeout=deadline)
+    for task in pending:
+        task.cancel()
+    if pending:
+        logger.info(
+            "Métadonnées non récupérées avant la deadline",
+            extra={"media_type": media_type, "pending": len(pending), "total": len(tasks), "deadline": deadline},
+        )
+    infos = {}
+    for task in done:
+        media_id = tasks[task]
+        if task.exception() is not None:
+            logger.warning(
+                "Récupération du média impossible",
+                extra={"media_type": media_type, "media_id": media_id, "error": repr(task.exception())},
+            )
+            continue
+        infos[media_id] = task.result()
+    return infos
 
-def get_recommendations_from_media(media_type: str, tmdb_id: str) -> list[dict]:
+async def get_recommendations_from_media(media_type: str, tmdb_id: str) -> list[dict]:
     """
     Récupère les recommandations d'un média à partir de son ID TMDB.
     """
-    url = f"{TMDB_BASE_URL}/{media_type}/{tmdb_id}/recommendations"
+    url = f"/{media_type}/{tmdb_id}/recommendations"
     params = {
         "api_key": TMDB_API_KEY,
         "language": "fr-FR"
     }
-    response = requests.get(url, params=params)
+    response = await get_client("tmdb").get(url, params=params)
     response.raise_for_status()
     return response.json().get("results", [])
 
-def build_prompt_from_liked_media(media_type: str, tmdb_ids: list[str]) -> str:
+async def describe_liked_media(media_type: str, tmdb_ids: list[str]) -> list[str]:
     """
-    Construit un prompt textuel basé sur les médias likés pour le LLM.
+    Décrit les médias likés ("Titre (genre, genre)") pour les prompts du LLM.
     """
     liked_media = []
+    infos = await get_media_infos(media_type, tmdb_ids)
     for tmdb_id in tmdb_ids:
+        data = infos.get(tmdb_id)
+        if data is None:
+            continue
         try:
-            data = get_media_info(media_type, tmdb_id)
             if media_type == "game":
                 title = data.get("name", "Inconnu")
                 genres = [g["name"] for g in data.get("genres", [])]
@@ -97,14 +185,21 @@ def build_prompt_from_liked_media(media_type: str, tmdb_ids: list[str]) -> str:
             genre_str = ", ".join(genres)
             liked_media.append(f"{title} ({genre_str})")
         except Exception as e:
-            print(f"[API] Erreur lors de la récupération du média {tmdb_id} : {e}")
+            logger.warning("Traitement du média impossible", extra={"media_type": media_type, "media_id": tmdb_id, "error": repr(e)})
+    return liked_media
+
+async def build_prompt_from_liked_media(media_type: str, tmdb_ids: list[str], count: int = 10) -> str:
+    """
+    Construit un prompt textuel basé sur les médias likés pour le LLM.
+    """
+    liked_media = await describe_liked_media(media_type, tmdb_ids)
     if not liked_media:
         return f"Je n'ai pas de {media_type} à recommander pour le moment."
     if media_type == "game":
         prompt = (
             "Basé sur les jeux vidéo suivants que j'ai aimés :\n"
             + "\n".join(f"- {media}" for media in liked_media)
-            + "\n\nRecommande-moi 10 jeux vidéo similaires. "
+            + f"\n\nRecommande-moi {count} jeux vidéo similaires. "
             + "Ta réponse DOIT être uniquement un tableau JSON contenant les titres. "
             + "Ne fournis aucune explication, introduction ou formatage. "
             + "Exemple de réponse attendue : [\"Jeu A\", \"Jeu B\", \"Jeu C\"]"
@@ -113,7 +208,7 @@ def build_prompt_from_liked_media(media_type: str, tmdb_ids: list[str]) -> str:
         prompt = (
             "Basé sur les livres suivants que j'ai aimés :\n"
             + "\n".join(f"- {media}" for media in liked_media)
-            + "\n\nRecommande-moi 10 livres similaires. "
+            + f"\n\nRecommande-moi {count} livres similaires. "
             + "Ta réponse DOIT être uniquement un tableau JSON contenant les titres. "
             + "Ne fournis aucune explication, introduction ou formatage. "
             + "Exemple de réponse attendue : [\"Livre A\", \"Livre B\", \"Livre C\"]"
@@ -122,16 +217,59 @@ def build_prompt_from_liked_media(media_type: str, tmdb_ids: list[str]) -> str:
         prompt = (
             f"Basé sur les {media_type}s suivants que j'ai aimés :\n"
             + "\n".join(f"- {media}" for media in liked_media)
-            + f"\n\nRecommande-moi 10 {media_type}s similaires. "
+            + f"\n\nRecommande-moi {count} {media_type}s similaires. "
             + "Ta réponse DOIT être uniquement un tableau JSON contenant les titres. "
             + "Ne fournis aucune explication, introduction ou formatage. "
             + "Exemple de réponse attendue : [\"Titre A\", \"Titre B\", \"Titre C\"]"
         )
     return prompt
 
-def build_prompt_from_mood(media_type: str, mood: str) -> str:
+async def build_prompt_for_multiple_media(liked_ids_by_type: dict[str, list[str]], count: int = 3) -> str:
+    """
+    Construit un prompt unique demandant des recommandations pour plusieurs types de médias,
+    avec une réponse JSON indexée par type : {"movie": [...], "tv": [...], "game": [...]}.
+    """
+    media_types = list(liked_ids_by_type)
+    descriptions = await asyncio.gather(
+        *(describe_liked_media(media_type, ids) for media_type, ids in liked_ids_by_type.items())
+    )
+    labels = {"movie": "Films", "tv": "Séries", "game": "Jeux vidéo", "book": "Livres"}
+    sections = []
+    for media_type, liked_media in zip(media_types, descriptions):
+        if liked_media:
+            sections.append(
+                f"{labels.get(media_type, media_type)} ({media_type}) que j'ai aimés :\n"
+                + "\n".join(f"- {media}" for media in liked_media)
+            )
+    example = ", ".join(f'"{media_type}": ["Titre A", "Titre B"]' for media_type in media_types)
+    return (
+        "\n\n".join(sections)
+        + f"\n\nPour chacun des types suivants : {', '.join(media_types)}, "
+        + f"recommande-moi {count} titres similaires à ceux que j'ai aimés de ce type. "
+        + "Ta réponse DOIT être uniquement un objet JSON dont les clés sont les types et les valeurs "
+        + "des tableaux de titres. "
+        + "Ne fournis aucune explication, introduction ou formatage. "
+        + f"Exemple de réponse attendue : {{{example}}}"
+    )
+
+def build_prompt_for_rerank(media_type: str, liked_titles: list[str], candidate_titles: list[str]) -> str:
+    """
+    Construit un prompt demandant au LLM de re-classer des candidats déjà sélectionnés.
+    """
+    return (
+        f"Basé sur les {media_type}s suivants que j'ai aimés :\n"
+        + "\n".join(f"- {title}" for title in liked_titles)
+        + f"\n\nClasse les {media_type}s suivants du plus au moins pertinent pour moi :\n"
+        + "\n".join(f"- {title}" for title in candidate_titles)
+        + "\n\nTa réponse DOIT être uniquement un tableau JSON contenant les titres, dans l'ordre. "
+        + "N'ajoute aucun titre absent de la liste. "
+        + "Ne fournis aucune explication, introduction ou formatage."
+    )
+
+def build_prompt_from_mood(media_type: str, mood: str, avoid: Sequence[str] = ()) -> str:
     """
     Construit un prompt pour le LLM basé sur une ambiance et un type de média.
+    `avoid` : titres déjà proposés pour cette ambiance (variantes précédentes), à ne pas répéter.
     """
     if media_type == "game":
         prompt = (
@@ -157,23 +295,25 @@ def build_prompt_from_mood(media_type: str, mood: str) -> str:
             "Ne fournis aucune explication, introduction ou formatage. "
             "Exemple de réponse attendue : [\"Titre A\", \"Titre B\", \"Titre C\"]"
         )
+    if avoid:
+        prompt += "\n\nN'inclus aucun de ces titres, déjà proposés :\n" + "\n".join(f"- {title}" for title in avoid)
     return prompt
 
 # Fonctions spécifiques pour compatibilité descendante (films)
-def get_top_movies(time_window: str = "day") -> list[dict]:
-    return get_top_media("movie", time_window)
+async def get_top_movies(time_window: str = "day") -> list[dict]:
+    return await get_top_media("movie", time_window)
 
-def get_movie_info(tmdb_id: str) -> dict:
-    return get_media_info("movie", tmdb_id)
+async def get_movie_info(tmdb_id: str) -> dict:
+    return await get_media_info("movie", tmdb_id)
 
-def search_movie(title: str) -> Optional[dict]:
-    return search_media("movie", title)
+async def search_movie(title: str) -> Optional[dict]:
+    return await search_media("movie", title)
 
-def get_recommendations_from_movie(tmdb_id: str) -> list[dict]:
-    return get_recommendations_from_media("movie", tmdb_id)
+async def get_recommendations_from_movie(tmdb_id: str) -> list[dict]:
+    return await get_recommendations_from_media("movie", tmdb_id)
 
-def build_prompt_from_liked_movies(tmdb_ids: list[str]) -> str:
-    return build_prompt_from_liked_media("movie", tmdb_ids)
+async def build_prompt_from_liked_movies(tmdb_ids: list[str]) -> str:
+    return await build_prompt_from_liked_media("movie", tmdb_ids)
 
 def build_prompt_from_mood_movie(mood: str) -> str:
     return build_prompt_from_mood("movie", mood)
@@ -0,0 +1,67 @@
+import logging
+import asyncio
+import time
+from typing import Awaitable, Callable
+from .tmdb_client import get_top_media
+from .rawg_client import get_top_games
+from .similarity import similarity_engine
+from .catalog import catalog
+from ..config import TRENDING_REFRESH_INTERVAL, TRENDING_GAMES_PAGE_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class TrendingStore:
+    """
+    Listes de tendances gardées en mémoire et rafraîchies en tâche de fond.
+    Stale-while-revalidate : en cas d'erreur amont, la dernière copie connue reste servie.
+    """
+
+    def __init__(self, sources: dict[str, Callable[[], Awaitable[list[dict]]]], interval: float):
+        self.sources = sources
+        self.interval = interval
+        self._data: dict[str, list[dict]] = {}
+        self._updated_at: dict[str, float] = {}
+        self._locks = {key: asyncio.Lock() for key in sources}
+
+    async def refresh(self, key: str) -> None:
+        async with self._locks[key]:
+            try:
+                self._data[key] = await self.sources[key]()
+                self._updated_at[key] = time.time()
+                similarity_engine.observe(key, self._data[key])
+                catalog.observe(key, self._data[key])
+            except Exception as e:
+                logger.warning("Rafraîchissement des tendances impossible, copie précédente conservée", extra={"key": key, "error": repr(e)})
+
+    async def refresh_all(self) -> None:
+        await asyncio.gather(*(self.refresh(key) for key in self.sources))
+
+    async def get(self, key: str) -> list[dict]:
+        """
+        Retourne la liste en mémoire ; ne contacte l'amont que si elle n'a jamais été chargée.
+        """
+        if key not in self._data:
+            await self.refresh(key)
+        return self._data.get(key, [])
+
+    def updated_at(self, key: str) -> float | None:
+        return self._updated_at.get(key)
+
+    async def run(self) -> None:
+        """
+        Boucle de rafraîchissement périodique, lancée dans le lifespan de l'application.
+        """
+        while True:
+            await self.refresh_all()
+            await asyncio.sleep(self.interval)
+
+
+trending_store = TrendingStore(
+    {
+        "movie": lambda: get_top_media("movie", "day"),
+        "tv": lambda: get_top_media("tv", "day"),
+        "game": lambda: get_top_games(page_size=TRENDING_GAMES_PAGE_SIZE),
+    },
+    TRENDING_REFRESH_INTERVAL,
+)
@@ -0,0 +1,373 @@
+"""
+Benchmark de charge de l'API, hors ligne : démarre les fournisseurs de substitution (bench.stubs),
+un mongod local éphémère (sauf --mongo-uri) et l'application, puis mesure chaque scénario à
+plusieurs niveaux de concurrence (p50/p95/p99, req/s). Les résultats sont écrits en JSON
+(avec le commit courant) pour comparer les performances entre commits (--compare).
+
+Les quotas amont de l'application sont levés par défaut (les stubs simulent les 429 via
+--fault fournisseur.throttle_rate) ; --env permet de rétablir n'importe quel réglage.
+
+Usage : python -m bench.bench_api [--concurrency 1,8,32] [--duration 10] [--scenarios login,like]
+                                  [--fault openrouter.latency_ms=3000] [--compare bench/results/ancien.json]
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from dataclasses import asdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+import httpx
+from app.schemas.interaction import Mood
+from .stubs import FIXTURES_DIR, PROVIDERS, parse_faults
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).parent / "results"
+SCENARIOS = ("login", "like", "recommendations", "multiple_media", "mood")
+MEDIA_TYPES = ("movie", "tv", "game", "book")
+PASSWORD = "benchmark-password"
+# Likes initiaux par utilisateur et par type de média
+SEED_LIKES = 3
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        return subprocess.run(["git", *args], cwd=ROOT_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _media_ids() -> dict[str, list[str]]:
+    tmdb = json.loads((FIXTURES_DIR / "tmdb.json").read_text(encoding="utf-8"))
+    rawg = json.loads((FIXTURES_DIR / "rawg.json").read_text(encoding="utf-8"))
+    openlibrary = json.loads((FIXTURES_DIR / "openlibrary.json").read_text(encoding="utf-8"))
+    return {
+        "movie": [str(m["id"]) for m in tmdb["movie"]],
+        "tv": [str(m["id"]) for m in tmdb["tv"]],
+        "game": [str(g["id"]) for g in rawg["games"]],
+        "book": [w["key"].replace("/works/", "") for w in openlibrary["works"]],
+    }
+
+
+class Processes:
+    """
+    Processus annexes (stubs, mongod, application), arrêtés ensemble à la sortie.
+    """
+
+    def __init__(self):
+        self._processes: list[tuple[str, subprocess.Popen]] = []
+        self._directories: list[str] = []
+
+    def start(self, name: str, command: list[str], env: Optional[dict] = None) -> subprocess.Popen:
+        process = subprocess.Popen(command, cwd=ROOT_DIR, env=env, stdout=subprocess.DEVNULL)
+        self._processes.append((name, process))
+        return process
+
+    def temporary_directory(self) -> str:
+        # /dev/shm quand il existe : données Mongo en mémoire
+        directory = tempfile.mkdtemp(prefix="bench-mongo-", dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+        self._directories.append(directory)
+        return directory
+
+    def check(self) -> None:
+        for name, process in self._processes:
+            if process.poll() is not None:
+                raise RuntimeError(f"{name} s'est arrêté (code {process.returncode})")
+
+    def stop(self) -> None:
+        for _, process in reversed(self._processes):
+            process.terminate()
+        for _, process in reversed(self._processes):
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        for directory in self._directories:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+async def _wait_ready(processes: Processes, url: str, timeout: float) -> None:
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient(timeout=1.0) as client:
+        while True:
+            processes.check()
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            if time.perf_counter() > deadline:
+                raise RuntimeError(f"{url} ne répond pas après {timeout:.0f} s")
+            await asyncio.sleep(0.2)
+
+
+async def _wait_port(processes: Processes, port: int, timeout: float) -> None:
+    deadline = time.perf_counter() + timeout
+    while True:
+        processes.check()
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise RuntimeError(f"Port {port} fermé après {timeout:.0f} s")
+            await asyncio.sleep(0.2)
+
+
+async def start_environment(processes: Processes, args: argparse.Namespace) -> str:
+    """
+    Démarre stubs, Mongo et application ; retourne l'URL de base de l'API.
+    """
+    stub_port = _free_port()
+    stub_command = [sys.executable, "-m", "bench.stubs", "--port", str(stub_port), "--seed", str(args.seed)]
+    for fault in args.fault:
+        stub_command += ["--fault", fault]
+    processes.start("bench.stubs", stub_command)
+
+    mongo_uri = args.mongo_uri
+    if mongo_uri is None:
+        mongod = shutil.which("mongod")
+        if mongod is None:
+            raise RuntimeError("mongod introuvable : l'installer ou passer --mongo-uri (base dédiée au benchmark)")
+        mongo_port = _free_port()
+        processes.start("mongod", [
+            mongod, "--dbpath", processes.temporary_directory(), "--port", str(mongo_port),
+            "--bind_ip", "127.0.0.1", "--quiet",
+        ])
+        await _wait_port(processes, mongo_port, 30)
+        mongo_uri = f"mongodb://127.0.0.1:{mongo_port}"
+
+    stub_url = f"http://127.0.0.1:{stub_port}"
+    env = {
+        **os.environ,
+        "MONGO_URI": mongo_uri,
+        "TMDB_API_KEY": "bench",
+        "RAWG_API_KEY": "bench",
+        "OPENROUTER_API_KEY": "bench",
+        "LOG_LEVEL": "WARNING",
+        **{f"{provider.upper()}_BASE_URL": f"{stub_url}/{provider}" for provider in PROVIDERS},
+        **{f"{provider.upper()}_RATE_LIMIT": "10000" for provider in PROVIDERS},
+    }
+    for override in args.env:
+        key, _, value = override.partition("=")
+        env[key] = value
+    api_port = _free_port()
+    processes.start("application", [
+        sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(api_port),
+        "--workers", str(args.workers), "--no-access-log", "--log-level", "warning",
+    ], env=env)
+    await _wait_ready(processes, f"{stub_url}/health", 30)
+    api_url = f"http://127.0.0.1:{api_port}"
+    await _wait_ready(processes, f"{api_url}/metrics", 60)
+    return api_url
+
+
+async def _register_users(client: httpx.AsyncClient, count: int, run_id: str) -> list[dict]:
+    """
+    Crée `count` utilisateurs, récupère leurs jetons et enregistre leurs premiers likes.
+    """
+    media_ids = _media_ids()
+    semaphore = asyncio.Semaphore(8)
+
+    async def register(i: int) -> dict:
+        email = f"bench-{run_id}-{i}@example.com"
+        async with semaphore:
+            r = await client.post("/api/auth/register", json={"email": email, "username": f"bench{i}", "password": PASSWORD})
+            r.raise_for_status()
+            r = await client.post("/api/auth/login", json={"email": email, "password": PASSWORD})
+            r.raise_for_status()
+            user = {"email": email, "headers": {"Authorization": f"Bearer {r.json()['access_token']}"}}
+            for media_type, ids in media_ids.items():
+                for media_id in random.sample(ids, SEED_LIKES):
+                    r = await client.post("/api/like", json={"media_id": media_id, "media_type": media_type}, headers=user["headers"])
+                    r.raise_for_status()
+        return user
+
+    return await asyncio.gather(*(register(i) for i in range(count)))
+
+
+def _request(scenario: str, user: dict, media_ids: dict[str, list[str]]) -> tuple[str, str, dict]:
+    """
+    Requête (méthode, chemin, arguments httpx) d'un scénario pour un utilisateur.
+    """
+    media_type = random.choice(MEDIA_TYPES)
+    if scenario == "login":
+        return "POST", "/api/auth/login", {"json": {"email": user["email"], "password": PASSWORD}}
+    if scenario == "like":
+        media_id = random.choice(media_ids[media_type])
+        return "POST", "/api/like", {"json": {"media_id": media_id, "media_type": media_type}, "headers": user["headers"]}
+    if scenario == "recommendations":
+        return "GET", "/api/recommendations", {"params": {"media_type": media_type}, "headers": user["headers"]}
+    if scenario == "multiple_media":
+        return "GET", "/api/recommendations/multiple_media", {"headers": user["headers"]}
+    mood = random.choice(list(Mood)).value
+    return "POST", "/api/recommendations/mood", {
+        "json": {"mood": mood}, "params": {"media_type": media_type}, "headers": user["headers"],
+    }
+
+
+def _percentile(values: list[float], q: float) -> Optional[float]:
+    # Rang le plus proche, sur des valeurs triées
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, math.ceil(q / 100 * len(values)) - 1))]
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+async def run_level(
+    client: httpx.AsyncClient, scenario: str, concurrency: int, duration: float,
+    users: list[dict], media_ids: dict[str, list[str]],
+) -> dict:
+    """
+    `concurrency` clients en boucle fermée pendant `duration` secondes sur un scénario.
+    """
+    latencies = []
+    statuses = Counter()
+    stop = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < stop:
+            method, path, kwargs = _request(scenario, random.choice(users), media_ids)
+            started = time.perf_counter()
+            try:
+                status = str((await client.request(method, path, **kwargs)).status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[status] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": sum(count for status, count in statuses.items() if not status.startswith("2")),
+        "rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": _ms(_percentile(latencies, 50)),
+        "p95_ms": _ms(_percentile(latencies, 95)),
+        "p99_ms": _ms(_percentile(latencies, 99)),
+        "max_ms": _ms(latencies[-1] if latencies else None),
+        "statuses": dict(statuses),
+    }
+
+
+def compare(results: list[dict], previous_path: Path) -> None:
+    """
+    Affiche l'écart (req/s, p95) avec un fichier de résultats précédent.
+    """
+    previous = json.loads(previous_path.read_text(encoding="utf-8"))
+    baseline = {(r["scenario"], r["concurrency"]): r for r in previous["results"]}
+    print(f"\nComparaison avec {previous_path} (commit {previous['meta'].get('commit')}) :")
+    for result in results:
+        old = baseline.get((result["scenario"], result["concurrency"]))
+        if old is None or not old["rps"] or not old["p95_ms"] or result["p95_ms"] is None:
+            continue
+        rps_delta = (result["rps"] / old["rps"] - 1) * 100
+        p95_delta = (result["p95_ms"] / old["p95_ms"] - 1) * 100
+        print(f"{result['scenario']:<16} c={result['concurrency']:>3} : req/s {rps_delta:+6.1f} %  p95 {p95_delta:+6.1f} %")
+
+
+async def run(args: argparse.Namespace) -> dict:
+    random.seed(args.seed)
+    started_at = datetime.now(timezone.utc)
+    processes = Processes()
+    results = []
+    try:
+        api_url = await start_environment(processes, args)
+        limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+        async with httpx.AsyncClient(base_url=api_url, timeout=args.timeout, limits=limits) as client:
+            run_id = f"{int(time.time())}-{os.getpid()}"
+            users = await _register_users(client, args.users, run_id)
+            media_ids = _media_ids()
+            # Tâches de fond de l'application (tendances, catalogue, humeurs) avant les mesures
+            await asyncio.sleep(args.settle)
+            for scenario in args.scenarios:
+                if args.warmup:
+                    await run_level(client, scenario, 1, args.warmup, users, media_ids)
+                for concurrency in args.concurrency:
+                    processes.check()
+                    result = await run_level(client, scenario, concurrency, args.duration, users, media_ids)
+                    results.append(result)
+                    print(
+                        f"{scenario:<16} c={concurrency:>3} : {result['rps']:8.1f} req/s  "
+                        f"p50 {result['p50_ms']} ms  p95 {result['p95_ms']} ms  p99 {result['p99_ms']} ms  "
+                        f"erreurs {result['errors']}/{result['requests']}"
+                    )
+    finally:
+        processes.stop()
+    commit = _git("rev-parse", "HEAD")
+    return {
+        "meta": {
+            "commit": commit,
+            "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+            "started_at": started_at.isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "mongo": "external" if args.mongo_uri else "mongod",
+            "arguments": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "mongo_uri")},
+            "faults": {provider: asdict(profile) for provider, profile in parse_faults(args.fault).items()},
+        },
+        "results": results,
+    }
+
+
+def _csv(cast):
+    return lambda value: [cast(v) for v in value.split(",") if v]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", type=_csv(str), default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=_csv(int), default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=10.0, help="secondes par scénario et niveau")
+    parser.add_argument("--warmup", type=float, default=2.0, help="secondes de préchauffage par scénario")
+    parser.add_argument("--settle", type=float, default=3.0, help="secondes d'attente après l'initialisation")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=1, help="processus uvicorn de l'application")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--fault", action="append", default=[], help="fournisseur.champ=valeur (voir bench.stubs)")
+    parser.add_argument("--env", action="append", default=[], help="CLÉ=valeur pour l'application (répétable)")
+    parser.add_argument("--mongo-uri", default=None, help="Mongo existant (sinon mongod éphémère)")
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument("--compare", type=Path, default=None, help="résultats précédents à comparer")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"scénarios inconnus : {', '.join(sorted(unknown))}")
+    try:
+        parse_faults(args.fault)
+    except ValueError as e:
+        parser.error(str(e))
+    report = asyncio.run(run(args))
+    output = args.output or RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}-{(report['meta']['commit'] or 'nocommit')[:10]}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"Résultats écrits dans {output}")
+    if args.compare:
+        compare(report["results"], args.compare)
@@ -0,0 +1,48 @@
+"""
+Benchmark du hashage bcrypt : connexions/s (verify) par nombre de processus.
+
+Usage : python -m bench.bench_bcrypt [--rounds 12] [--logins 64]
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from passlib.context import CryptContext
+
+
+def _context(rounds: int) -> CryptContext:
+    return CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=rounds)
+
+
+def _verify(args: tuple[int, str, str]) -> bool:
+    rounds, password, hashed = args
+    return _context(rounds).verify(password, hashed)
+
+
+def run(rounds: int, logins: int) -> list[dict]:
+    hashed = _context(rounds).hash("benchmark-password")
+    results = []
+    cores = os.cpu_count() or 1
+    workers = 1
+    while True:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Préchauffage des processus
+            list(pool.map(_verify, [(rounds, "benchmark-password", hashed)] * workers))
+            start = time.perf_counter()
+            list(pool.map(_verify, [(rounds, "benchmark-password", hashed)] * logins))
+            elapsed = time.perf_counter() - start
+        rate = logins / elapsed
+        results.append({"workers": workers, "logins_per_sec": rate, "logins_per_sec_per_core": rate / workers})
+        print(f"rounds={rounds} workers={workers:>2} : {rate:7.1f} logins/s ({rate / workers:6.1f} /cœur)")
+        if workers >= cores:
+            break
+        workers = min(workers * 2, cores)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=int(os.getenv("BCRYPT_ROUNDS", "12")))
+    parser.add_argument("--logins", type=int, default=64)
+    args = parser.parse_args()
+    run(args.rounds, args.logins)
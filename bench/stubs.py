@@ -0,0 +1,334 @@
+"""
+Serveur de substitution des fournisseurs amont (TMDB, RAWG, Open Library, OpenRouter) pour les
+benchmarks : rejoue les fixtures de bench/fixtures, avec latence, gigue et injection d'erreurs
+configurables par fournisseur.
+
+Chaque fournisseur est servi sous son préfixe (http://127.0.0.1:8900/tmdb, /rawg, /openlibrary,
+/openrouter), à utiliser comme *_BASE_URL de l'application. Les réponses d'OpenRouter proposent
+des titres présents dans les fixtures, pour que leur résolution aboutisse.
+
+Usage : python -m bench.stubs [--port 8900] [--fault openrouter.latency_ms=1500] [--fault "*.error_rate=0.05"]
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import unicodedata
+from dataclasses import dataclass, fields, replace
+from pathlib import Path
+from typing import Optional
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+PROVIDERS = ("tmdb", "rawg", "openlibrary", "openrouter")
+
+
+@dataclass(frozen=True)
+class FaultProfile:
+    """Comportement injecté dans les réponses d'un fournisseur."""
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    # Parts des requêtes en 503, en 429 (avec Retry-After) et bloquées `hang_ms` (timeouts de lecture)
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    hang_rate: float = 0.0
+    hang_ms: float = 30000.0
+    # OpenRouter streamé : délai entre deux fragments (la latence est celle du premier fragment)
+    token_delay_ms: float = 0.0
+
+
+# Ordres de grandeur observés sur les API réelles
+DEFAULT_PROFILES = {
+    "tmdb": FaultProfile(latency_ms=60, jitter_ms=20),
+    "rawg": FaultProfile(latency_ms=150, jitter_ms=50),
+    "openlibrary": FaultProfile(latency_ms=250, jitter_ms=100),
+    "openrouter": FaultProfile(latency_ms=1500, jitter_ms=500, token_delay_ms=20),
+}
+
+
+def parse_faults(overrides: list[str]) -> dict[str, FaultProfile]:
+    """
+    Profils par défaut surchargés par des entrées "fournisseur.champ=valeur" ("*" : tous les fournisseurs).
+    Lève ValueError si une entrée est invalide.
+    """
+    profiles = dict(DEFAULT_PROFILES)
+    names = {f.name for f in fields(FaultProfile)}
+    for override in overrides:
+        key, _, value = override.partition("=")
+        provider, _, name = key.partition(".")
+        if (provider != "*" and provider not in profiles) or name not in names or not value:
+            raise ValueError(f"Surcharge invalide : {override!r} (attendu fournisseur.champ=valeur)")
+        for target in (PROVIDERS if provider == "*" else (provider,)):
+            profiles[target] = replace(profiles[target], **{name: float(value)})
+    return profiles
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode("ascii")
+    return " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def _matches(query: str, *values) -> bool:
+    # Correspondance sur des mots entiers, dans un sens ou dans l'autre
+    query = f" {_normalize(query)} "
+    if not query.strip():
+        return False
+    for value in values:
+        value = f" {_normalize(value)} " if value else ""
+        if value.strip() and (query in value or value in query):
+            return True
+    return False
+
+
+def _page(items: list, page: int, size: int) -> list:
+    start = (max(1, page) - 1) * size
+    return items[start:start + size]
+
+
+def _int_param(request: Request, name: str, default: int) -> int:
+    try:
+        return int(request.query_params.get(name, default))
+    except ValueError:
+        return default
+
+
+class Fixtures:
+    """
+    Médias enregistrés par fournisseur, indexés par id.
+    """
+
+    def __init__(self, directory: Path):
+        tmdb = json.loads((directory / "tmdb.json").read_text(encoding="utf-8"))
+        self.tmdb = {media_type: {str(item["id"]): item for item in items} for media_type, items in tmdb.items()}
+        rawg = json.loads((directory / "rawg.json").read_text(encoding="utf-8"))
+        self.games = {str(game["id"]): game for game in rawg["games"]}
+        openlibrary = json.loads((directory / "openlibrary.json").read_text(encoding="utf-8"))
+        self.works = {work["key"].replace("/works/", ""): work for work in openlibrary["works"]}
+
+    def titles(self, media_type: str) -> list[str]:
+        if media_type == "game":
+            return [game["name"] for game in self.games.values()]
+        if media_type == "book":
+            return [work["title"] for work in self.works.values()]
+        return [item.get("title") or item.get("name") for item in self.tmdb.get(media_type, {}).values()]
+
+
+async def _inject(profile: FaultProfile) -> Optional[Response]:
+    """
+    Attend la latence simulée ; retourne la réponse d'erreur injectée, ou None.
+    """
+    roll = random.random()
+    if roll < profile.hang_rate:
+        await asyncio.sleep(profile.hang_ms / 1000)
+    await asyncio.sleep(max(0.0, random.gauss(profile.latency_ms, profile.jitter_ms)) / 1000)
+    roll = random.random()
+    if roll < profile.error_rate:
+        return JSONResponse({"status_message": "Service indisponible (injecté)"}, status_code=503)
+    if roll < profile.error_rate + profile.throttle_rate:
+        return JSONResponse({"status_message": "Quota dépassé (injecté)"}, status_code=429, headers={"Retry-After": "1"})
+    return None
+
+
+def _faulty(provider: str, profiles: dict[str, FaultProfile], handler):
+    async def endpoint(request: Request) -> Response:
+        injected = await _inject(profiles[provider])
+        return injected if injected is not None else await handler(request)
+    return endpoint
+
+
+def _tmdb_routes(fixtures: Fixtures) -> list[Route]:
+    def items(media_type: str) -> list[dict]:
+        return sorted(fixtures.tmdb.get(media_type, {}).values(), key=lambda m: -m.get("popularity", 0))
+
+    def not_found() -> JSONResponse:
+        return JSONResponse({"status_code": 34, "status_message": "The resource you requested could not be found."}, status_code=404)
+
+    async def trending(request: Request) -> Response:
+        return JSONResponse({"page": 1, "results": items(request.path_params["media_type"])})
+
+    async def popular(request: Request) -> Response:
+        results = _page(items(request.path_params["media_type"]), _int_param(request, "page", 1), 20)
+        return JSONResponse({"page": _int_param(request, "page", 1), "results": results})
+
+    async def search(request: Request) -> Response:
+        media_type = request.path_params["media_type"]
+        query = request.query_params.get("query", "")
+        year = request.query_params.get("year") or request.query_params.get("first_air_date_year")
+        results = [
+            m for m in items(media_type)
+            if _matches(query, m.get("title") or m.get("name"), m.get("original_title") or m.get("original_name"))
+            and (not year or (m.get("release_date") or m.get("first_air_date") or "").startswith(year))
+        ]
+        return JSONResponse({"page": 1, "results": results, "total_results": len(results)})
+
+    async def details(request: Request) -> Response:
+        item = fixtures.tmdb.get(request.path_params["media_type"], {}).get(request.path_params["media_id"])
+        return JSONResponse(item) if item is not None else not_found()
+
+    async def recommendations(request: Request) -> Response:
+        media_type, media_id = request.path_params["media_type"], request.path_params["media_id"]
+        if media_id not in fixtures.tmdb.get(media_type, {}):
+            return not_found()
+        return JSONResponse({"page": 1, "results": [m for m in items(media_type) if str(m["id"]) != media_id]})
+
+    return [
+        Route("/trending/{media_type}/{time_window}", trending),
+        Route("/search/{media_type}", search),
+        Route("/{media_type}/popular", popular),
+        Route("/{media_type}/{media_id}/recommendations", recommendations),
+        Route("/{media_type}/{media_id}", details),
+    ]
+
+
+def _rawg_routes(fixtures: Fixtures) -> list[Route]:
+    def items() -> list[dict]:
+        return sorted(fixtures.games.values(), key=lambda g: -g.get("added", 0))
+
+    async def games(request: Request) -> Response:
+        search = request.query_params.get("search")
+        results = [g for g in items() if _matches(search, g["name"])] if search else items()
+        page = _page(results, _int_param(request, "page", 1), _int_param(request, "page_size", 20))
+        return JSONResponse({"count": len(results), "results": page})
+
+    async def details(request: Request) -> Response:
+        game = fixtures.games.get(request.path_params["game_id"])
+        return JSONResponse(game) if game is not None else JSONResponse({"detail": "Not found."}, status_code=404)
+
+    async def suggested(request: Request) -> Response:
+        game_id = request.path_params["game_id"]
+        results = [g for g in items() if str(g["id"]) != game_id][:_int_param(request, "page_size", 10)]
+        return JSONResponse({"count": len(results), "results": results})
+
+    return [
+        Route("/games", games),
+        Route("/games/{game_id}/suggested", suggested),
+        Route("/games/{game_id}", details),
+    ]
+
+
+def _openlibrary_routes(fixtures: Fixtures) -> list[Route]:
+    async def search(request: Request) -> Response:
+        query = request.query_params.get("q", "")
+        docs = [
+            w for w in fixtures.works.values()
+            if _matches(query, w["title"], *w.get("author_name", []), *w.get("subject", []))
+        ][:_int_param(request, "limit", 100)]
+        return JSONResponse({"numFound": len(docs), "docs": docs})
+
+    async def work(request: Request) -> Response:
+        work = fixtures.works.get(request.path_params["olid"])
+        if work is None:
+            return JSONResponse({"error": "notfound", "key": request.url.path}, status_code=404)
+        return JSONResponse({
+            "key": work["key"],
+            "title": work["title"],
+            "description": work.get("description"),
+            "subjects": work.get("subjects", []),
+            "covers": [work["cover_i"]] if work.get("cover_i") else [],
+        })
+
+    async def trending(request: Request) -> Response:
+        works = _page(list(fixtures.works.values()), _int_param(request, "page", 1), _int_param(request, "limit", 50))
+        return JSONResponse({"query": "/trending/weekly", "works": works})
+
+    return [
+        Route("/search.json", search),
+        Route("/works/{olid}.json", work),
+        Route("/trending/weekly.json", trending),
+    ]
+
+
+def _llm_answer(prompt: str, fixtures: Fixtures) -> str:
+    """
+    Réponse vraisemblable au prompt (tableau ou objet JSON de titres connus des fixtures).
+    """
+    if "objet JSON" in prompt:
+        match = re.search(r"types suivants : ([a-z, ]+?),\s*recommande", prompt)
+        media_types = [t.strip() for t in match.group(1).split(",")] if match else ["movie"]
+        answer = {t: random.sample(fixtures.titles(t), min(3, len(fixtures.titles(t)))) for t in media_types}
+    elif "Classe les" in prompt:
+        candidates = prompt.split("pertinent pour moi :", 1)[-1]
+        answer = [line[2:] for line in candidates.splitlines() if line.startswith("- ")]
+    else:
+        if "jeux vidéo" in prompt:
+            media_type = "game"
+        elif "livres" in prompt:
+            media_type = "book"
+        elif "tvs" in prompt:
+            media_type = "tv"
+        else:
+            media_type = "movie"
+        count = re.search(r"(\d+) (?:jeux|livres|movies|tvs)", prompt)
+        titles = fixtures.titles(media_type)
+        answer = random.sample(titles, min(int(count.group(1)) if count else 10, len(titles)))
+    return "```json\n" + json.dumps(answer, ensure_ascii=False) + "\n```"
+
+
+def _openrouter_routes(fixtures: Fixtures, profile: FaultProfile) -> list[Route]:
+    async def completions(request: Request) -> Response:
+        payload = await request.json()
+        prompt = payload["messages"][-1]["content"]
+        content = _llm_answer(prompt, fixtures)
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4, "total_tokens": (len(prompt) + len(content)) // 4}
+        if not payload.get("stream"):
+            return JSONResponse({
+                "id": "gen-bench",
+                "model": payload.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        async def events():
+            yield ": OPENROUTER PROCESSING\n\n"
+            for i in range(0, len(content), 8):
+                if i:
+                    await asyncio.sleep(profile.token_delay_ms / 1000)
+                chunk = {"choices": [{"index": 0, "delta": {"content": content[i:i + 8]}}]}
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+            yield f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return [Route("/chat/completions", completions, methods=["POST"])]
+
+
+def create_app(profiles: dict[str, FaultProfile], fixtures_dir: Path = FIXTURES_DIR) -> Starlette:
+    fixtures = Fixtures(fixtures_dir)
+    routes = {
+        "tmdb": _tmdb_routes(fixtures),
+        "rawg": _rawg_routes(fixtures),
+        "openlibrary": _openlibrary_routes(fixtures),
+        "openrouter": _openrouter_routes(fixtures, profiles["openrouter"]),
+    }
+
+    async def health(request: Request) -> Response:
+        return JSONResponse({"status": "ok"})
+
+    return Starlette(routes=[
+        Route("/health", health),
+        *(
+            Mount(f"/{provider}", routes=[
+                Route(route.path, _faulty(provider, profiles, route.endpoint), methods=route.methods)
+                for route in provider_routes
+            ])
+            for provider, provider_routes in routes.items()
+        ),
+    ])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--fixtures", type=Path, default=FIXTURES_DIR)
+    parser.add_argument("--fault", action="append", default=[], help="fournisseur.champ=valeur (répétable)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    uvicorn.run(create_app(parse_faults(args.fault), args.fixtures), host=args.host, port=args.port, log_level="warning")